@@ -1,209 +1,626 @@
-import sys
+import argparse
+import os
+from collections import namedtuple
 
-def sign_extend(bin_str, bits):
-    """Converts a binary string in two's complement to a signed integer."""
-    if bin_str[0] == '1':
-        return int(bin_str, 2) - (1 << len(bin_str))
-    else:
-        return int(bin_str, 2)
-
-# Global state
-REGISTERS = [0] * 32        # 32 registers; x0 is always 0
-MEMORY = [0] * 32           # Data memory: 32 words (each 32 bits)
-INSTR_MEM = []              # Instruction memory: list of 32-bit binary strings
-PC = 0                      # Program Counter (in bytes)
+import isa
+from jit import BlockCache
+from loader import LazyProgram
+from memory import Memory
+from tracefile import TextTrace, BinaryTrace, DeltaTrace, NullTrace
+from isa import OP_R, OP_ADDI, OP_LW, OP_JALR, OP_S, OP_B, OP_J
 
-def update_x0():
-    """Ensure x0 remains 0."""
-    REGISTERS[0] = 0
+# A pre-decoded instruction. Register numbers, funct3/funct7 and the
+# sign-extended immediate are plain ints so the execute loop never touches
+# the instruction word again.
+Decoded = namedtuple('Decoded', 'opcode rd rs1 rs2 funct3 funct7 imm')
 
 # --- Decode Functions ---
 
-def decode_R(inst):
-    funct7 = inst[0:7]
-    rs2 = int(inst[7:12], 2)
-    rs1 = int(inst[12:17], 2)
-    funct3 = inst[17:20]
-    rd   = int(inst[20:25], 2)
-    return funct7, rs1, rs2, funct3, rd
-
-def decode_I(inst):
-    imm = inst[0:12]
-    rs1 = int(inst[12:17], 2)
-    funct3 = inst[17:20]
-    rd   = int(inst[20:25], 2)
-    return imm, rs1, funct3, rd
-
-def decode_S(inst):
-    imm_hi = inst[0:7]
-    rs2 = int(inst[7:12], 2)
-    rs1 = int(inst[12:17], 2)
-    funct3 = inst[17:20]
-    imm_lo = inst[20:25]
-    imm = imm_hi + imm_lo
-    return imm, rs1, rs2, funct3
-
-def decode_B(inst):
-    # B-type: [31] imm[12], [30:25] imm[10:5],
-    # [24:20] rs2, [19:15] rs1, [14:12] funct3, [11:8] imm[4:1], [7] imm[11]
-    imm12   = inst[0]
-    imm10_5 = inst[1:7]
-    rs2     = int(inst[7:12], 2)
-    rs1     = int(inst[12:17], 2)
-    funct3  = inst[17:20]
-    imm4_1  = inst[20:24]
-    imm11   = inst[24]
-    # Reassemble immediate with an appended 0 as LSB
-    imm_bin = imm12 + imm11 + imm10_5 + imm4_1 + '0'
-    return imm_bin, rs1, rs2, funct3
-
-def decode_J(inst):
-    # J-type: [31] imm[20], [30:21] imm[10:1], [20] imm[11], [19:12] imm[19:12], [11:7] rd
-    imm20   = inst[0]
-    imm10_1 = inst[1:11]
-    imm11   = inst[11]
-    imm19_12 = inst[12:20]
-    rd = int(inst[20:25], 2)
-    # Reassemble immediate and append a 0 as LSB
-    imm_bin = imm20 + imm19_12 + imm11 + imm10_1 + '0'
-    return imm_bin, rd
+def predecode(word):
+    """Decode a 32-bit instruction word once into a Decoded record."""
+    opcode = isa.opcode(word)
+    if opcode == OP_R:
+        return Decoded(opcode, isa.rd(word), isa.rs1(word), isa.rs2(word),
+                       isa.funct3(word), isa.funct7(word), 0)
+    elif opcode in (OP_ADDI, OP_LW, OP_JALR):
+        return Decoded(opcode, isa.rd(word), isa.rs1(word), 0,
+                       isa.funct3(word), 0, isa.imm_I(word))
+    elif opcode == OP_S:
+        return Decoded(opcode, 0, isa.rs1(word), isa.rs2(word),
+                       isa.funct3(word), 0, isa.imm_S(word))
+    elif opcode == OP_B:
+        return Decoded(opcode, 0, isa.rs1(word), isa.rs2(word),
+                       isa.funct3(word), 0, isa.imm_B(word))
+    elif opcode == OP_J:
+        return Decoded(opcode, isa.rd(word), 0, 0, 0, 0, isa.imm_J(word))
+    # Unknown opcodes execute as no-ops.
+    return Decoded(opcode, 0, 0, 0, 0, 0, 0)
+
+def is_halt(d):
+    """Virtual Halt is beq x0,x0,0."""
+    return d.opcode == OP_B and d.funct3 == 0 and d.rs1 == 0 and d.rs2 == 0 and d.imm == 0
 
 # --- Execute Functions ---
+# Each handler executes one pre-decoded instruction against the register
+# file R and data memory M, and returns the next PC.
 
-def execute_R(inst):
-    funct7, rs1, rs2, funct3, rd = decode_R(inst)
-    op1 = REGISTERS[rs1]
-    op2 = REGISTERS[rs2]
-    if funct3 == '000':
-        if funct7 == '0000000':  # add
-            REGISTERS[rd] = (op1 + op2) & 0xFFFFFFFF
-        elif funct7 == '0100000':  # sub
-            REGISTERS[rd] = (op1 - op2) & 0xFFFFFFFF
-    elif funct3 == '010':         # slt
-        REGISTERS[rd] = 1 if op1 < op2 else 0
-    elif funct3 == '101':         # srl
-        shamt = op2 & 0x1F
-        REGISTERS[rd] = (op1 & 0xFFFFFFFF) >> shamt
-    elif funct3 == '110':         # or
-        REGISTERS[rd] = op1 | op2
-    elif funct3 == '111':         # and
-        REGISTERS[rd] = op1 & op2
-
-def execute_I(inst, opcode):
-    imm, rs1, funct3, rd = decode_I(inst)
-    imm_val = sign_extend(imm, 12)
-    op1 = REGISTERS[rs1]
-    if opcode == "0010011":   # addi
-        REGISTERS[rd] = (op1 + imm_val) & 0xFFFFFFFF
-    elif opcode == "0000011":   # lw
-        addr = op1 + imm_val
-        index = addr // 4
-        if 0 <= index < len(MEMORY):
-            REGISTERS[rd] = MEMORY[index]
-        else:
-            REGISTERS[rd] = 0
-    elif opcode == "1100111":   # jalr
-        next_pc = PC + 4
-        REGISTERS[rd] = next_pc
-        target = (op1 + imm_val) & 0xFFFFFFFE
-        return target
-    return None
-
-def execute_S(inst):
-    imm, rs1, rs2, funct3 = decode_S(inst)
-    imm_val = sign_extend(imm, 12)
-    addr = REGISTERS[rs1] + imm_val
-    index = addr // 4
-    if 0 <= index < len(MEMORY):
-        MEMORY[index] = REGISTERS[rs2]
-
-def execute_B(inst):
-    imm_bin, rs1, rs2, funct3 = decode_B(inst)
-    imm_val = sign_extend(imm_bin, 13)
-    branch = False
-    op1 = REGISTERS[rs1]
-    op2 = REGISTERS[rs2]
-    if funct3 == '000':  # beq
-        branch = (op1 == op2)
-    elif funct3 == '001':  # bne
-        branch = (op1 != op2)
-    elif funct3 == '100':  # blt
-        branch = (op1 < op2)
-    return branch, imm_val
-
-def execute_J(inst):
-    imm_bin, rd = decode_J(inst)
-    imm_val = sign_extend(imm_bin, 21)
-    REGISTERS[rd] = (PC + 4) & 0xFFFFFFFF
-    return imm_val
+MASK32 = isa.MASK32
+
+def op_add(R, M, pc, d):
+    R[d.rd] = (R[d.rs1] + R[d.rs2]) & MASK32
+    return pc + 4
+
+def op_sub(R, M, pc, d):
+    R[d.rd] = (R[d.rs1] - R[d.rs2]) & MASK32
+    return pc + 4
+
+def op_slt(R, M, pc, d):
+    R[d.rd] = 1 if R[d.rs1] < R[d.rs2] else 0
+    return pc + 4
+
+def op_srl(R, M, pc, d):
+    R[d.rd] = (R[d.rs1] & MASK32) >> (R[d.rs2] & 0x1F)
+    return pc + 4
+
+def op_or(R, M, pc, d):
+    R[d.rd] = R[d.rs1] | R[d.rs2]
+    return pc + 4
+
+def op_and(R, M, pc, d):
+    R[d.rd] = R[d.rs1] & R[d.rs2]
+    return pc + 4
+
+def op_addi(R, M, pc, d):
+    R[d.rd] = (R[d.rs1] + d.imm) & MASK32
+    return pc + 4
+
+def op_lw(R, M, pc, d):
+    R[d.rd] = M.load(R[d.rs1] + d.imm)
+    return pc + 4
+
+def op_jalr(R, M, pc, d):
+    op1 = R[d.rs1]
+    R[d.rd] = pc + 4
+    return (op1 + d.imm) & 0xFFFFFFFE
+
+def op_sw(R, M, pc, d):
+    M.store(R[d.rs1] + d.imm, R[d.rs2])
+    return pc + 4
+
+def op_beq(R, M, pc, d):
+    return pc + d.imm if R[d.rs1] == R[d.rs2] else pc + 4
+
+def op_bne(R, M, pc, d):
+    return pc + d.imm if R[d.rs1] != R[d.rs2] else pc + 4
+
+def op_blt(R, M, pc, d):
+    return pc + d.imm if R[d.rs1] < R[d.rs2] else pc + 4
+
+def op_jal(R, M, pc, d):
+    R[d.rd] = (pc + 4) & MASK32
+    return pc + d.imm
+
+def op_nop(R, M, pc, d):
+    return pc + 4
+
+def op_halt(R, M, pc, d):
+    return pc + 4
+
+# Dispatch table keyed on (opcode, funct3, funct7); ANY matches every value
+# of a field the instruction does not use.
+ANY = None
+DISPATCH = {
+    (OP_R, 0b000, 0b0000000): op_add,
+    (OP_R, 0b000, 0b0100000): op_sub,
+    (OP_R, 0b010, ANY): op_slt,
+    (OP_R, 0b101, ANY): op_srl,
+    (OP_R, 0b110, ANY): op_or,
+    (OP_R, 0b111, ANY): op_and,
+    (OP_ADDI, ANY, ANY): op_addi,
+    (OP_LW, ANY, ANY): op_lw,
+    (OP_JALR, ANY, ANY): op_jalr,
+    (OP_S, ANY, ANY): op_sw,
+    (OP_B, 0b000, ANY): op_beq,
+    (OP_B, 0b001, ANY): op_bne,
+    (OP_B, 0b100, ANY): op_blt,
+    (OP_J, ANY, ANY): op_jal,
+}
+
+def resolve(d):
+    """Pick the handler for a pre-decoded instruction."""
+    if is_halt(d):
+        return op_halt
+    return (DISPATCH.get((d.opcode, d.funct3, d.funct7))
+            or DISPATCH.get((d.opcode, d.funct3, ANY))
+            or DISPATCH.get((d.opcode, ANY, ANY))
+            or op_nop)
+
+# --- Bound Instructions ---
+# run() executes each instruction through a closure op(R, M, pc) with its
+# operands bound when the instruction first runs, so neither the loop nor
+# the closure reads Decoded fields. Each binder does exactly what the
+# handler of the same name does.
+
+def bind_add(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = (R[rs1] + R[rs2]) & MASK32
+        return pc + 4
+    return op
+
+def bind_sub(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = (R[rs1] - R[rs2]) & MASK32
+        return pc + 4
+    return op
+
+def bind_slt(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = 1 if R[rs1] < R[rs2] else 0
+        return pc + 4
+    return op
+
+def bind_srl(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = (R[rs1] & MASK32) >> (R[rs2] & 0x1F)
+        return pc + 4
+    return op
+
+def bind_or(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = R[rs1] | R[rs2]
+        return pc + 4
+    return op
+
+def bind_and(d):
+    rd, rs1, rs2 = d.rd, d.rs1, d.rs2
+    def op(R, M, pc):
+        R[rd] = R[rs1] & R[rs2]
+        return pc + 4
+    return op
+
+def bind_addi(d):
+    rd, rs1, imm = d.rd, d.rs1, d.imm
+    def op(R, M, pc):
+        R[rd] = (R[rs1] + imm) & MASK32
+        return pc + 4
+    return op
+
+def bind_lw(d):
+    rd, rs1, imm = d.rd, d.rs1, d.imm
+    def op(R, M, pc):
+        R[rd] = M.load(R[rs1] + imm)
+        return pc + 4
+    return op
+
+def bind_jalr(d):
+    rd, rs1, imm = d.rd, d.rs1, d.imm
+    def op(R, M, pc):
+        op1 = R[rs1]
+        R[rd] = pc + 4
+        return (op1 + imm) & 0xFFFFFFFE
+    return op
+
+def bind_sw(d):
+    rs1, rs2, imm = d.rs1, d.rs2, d.imm
+    def op(R, M, pc):
+        M.store(R[rs1] + imm, R[rs2])
+        return pc + 4
+    return op
+
+def bind_beq(d):
+    rs1, rs2, imm = d.rs1, d.rs2, d.imm
+    def op(R, M, pc):
+        return pc + imm if R[rs1] == R[rs2] else pc + 4
+    return op
+
+def bind_bne(d):
+    rs1, rs2, imm = d.rs1, d.rs2, d.imm
+    def op(R, M, pc):
+        return pc + imm if R[rs1] != R[rs2] else pc + 4
+    return op
+
+def bind_blt(d):
+    rs1, rs2, imm = d.rs1, d.rs2, d.imm
+    def op(R, M, pc):
+        return pc + imm if R[rs1] < R[rs2] else pc + 4
+    return op
+
+def bind_jal(d):
+    rd, imm = d.rd, d.imm
+    def op(R, M, pc):
+        R[rd] = (pc + 4) & MASK32
+        return pc + imm
+    return op
+
+def bind_next(d):
+    def op(R, M, pc):
+        return pc + 4
+    return op
+
+BINDERS = {
+    op_add: bind_add, op_sub: bind_sub, op_slt: bind_slt, op_srl: bind_srl,
+    op_or: bind_or, op_and: bind_and, op_addi: bind_addi,
+    op_lw: bind_lw, op_jalr: bind_jalr, op_sw: bind_sw,
+    op_beq: bind_beq, op_bne: bind_bne, op_blt: bind_blt, op_jal: bind_jal,
+    op_nop: bind_next, op_halt: bind_next,
+}
+
+def bind(handler, d):
+    """run()'s entry for an instruction: (op, rd, halts)."""
+    binder = BINDERS.get(handler)
+    if binder is not None:
+        op = binder(d)
+    else:
+        def op(R, M, pc):
+            return handler(R, M, pc, d)
+    return op, d.rd, handler is op_halt
 
 # --- Simulation Loop ---
 
-def simulate(binary_file, trace_file):
-    global PC, REGISTERS, MEMORY, INSTR_MEM
-    REGISTERS = [0] * 32
-    MEMORY = [0] * 32
-    PC = 0
-    # Read the machine code file (each line is a 32-bit binary string)
-    with open(binary_file, 'r') as f:
-        INSTR_MEM = [line.strip() for line in f if line.strip()]
-
-    trace_lines = []
-    # Execute instructions and record the state AFTER each instruction execution.
-    while True:
-        index = PC // 4
-        if index < 0 or index >= len(INSTR_MEM):
-            break
-        inst = INSTR_MEM[index]
-        opcode = inst[25:32]
-
-        # Check for Virtual Halt (beq x0,x0,0)
-        if opcode == "1100011":
-            imm_bin, rs1, rs2, funct3 = decode_B(inst)
-            imm_val = sign_extend(imm_bin, 13)
-            if funct3 == "000" and rs1 == 0 and rs2 == 0 and imm_val == 0:
-                PC += 4
-                update_x0()
-                trace_lines.append(f"{PC} " + " ".join(str(reg) for reg in REGISTERS))
+# Step limit of a run without stop_at; never reached.
+NO_LIMIT = 1 << 62
+
+def load_program(binary_file):
+    """Read the machine code file (text lines of 32 '0'/'1' characters, or
+    packed little-endian words; see isa.program_format), pre-decode it and
+    resolve each instruction's handler."""
+    if isa.program_format(binary_file) == 'bin':
+        with open(binary_file, 'rb') as f:
+            instr_mem = isa.bytes_to_words(f.read()).tolist()
+    else:
+        with open(binary_file, 'r') as f:
+            instr_mem = [isa.text_to_word(line) for line in f if line.strip()]
+    decoded = [predecode(inst) for inst in instr_mem]
+    return instr_mem, decoded, [resolve(d) for d in decoded]
+
+class Machine:
+    """One simulated CPU: register file, data memory, loaded program and PC.
+
+    All execution state lives on the instance, so independent Machines can
+    run side by side in threads or worker processes."""
+    __slots__ = ('registers', 'memory', 'pc', 'steps', 'halted',
+                 'instr_mem', 'decoded', 'handlers', 'code', 'blocks', 'program', 'digest')
+
+    def __init__(self, memory=None):
+        self.registers = [0] * 32   # 32 registers; x0 is always 0
+        # Data memory; by default 32 words (each 32 bits)
+        self.memory = Memory.legacy() if memory is None else memory
+        self.pc = 0                 # Program Counter (in bytes)
+        self.steps = 0              # Instructions executed so far
+        self.halted = False         # Set once the program halts or leaves its code
+        self.instr_mem = []         # Instruction memory: list of 32-bit instruction words
+        self.decoded = []           # Pre-decoded instruction records, parallel to instr_mem
+        self.handlers = []          # Resolved execute handlers, parallel to instr_mem
+        self.code = None            # run()'s bound instructions, filled as they first run
+        self.blocks = None          # BlockCache, built by the first run_blocks()
+        self.program = None         # LazyProgram when loaded with lazy=True
+        self.digest = None          # program_digest(), once computed
+
+    def load(self, binary_file, lazy=False):
+        """Load a machine code file and reset the PC to 0. With lazy=True the
+        file is memory-mapped and instructions are decoded as they are reached."""
+        if self.program is not None:
+            self.program.close()
+            self.program = None
+        if lazy:
+            self.program = LazyProgram(binary_file, predecode, resolve)
+            self.instr_mem = None
+            self.decoded = self.program.decoded
+            self.handlers = self.program.handlers
+        else:
+            self.instr_mem, self.decoded, self.handlers = load_program(binary_file)
+        self.code = None
+        self.blocks = None
+        self.digest = None
+        self.pc = 0
+        self.steps = 0
+        self.halted = False
+
+    def program_digest(self):
+        """SHA-256 of the loaded instruction words, packed little-endian
+        whatever the file format, so eager and lazy loads of a program agree."""
+        if self.digest is None:
+            import hashlib
+            program = self.program
+            if program is None:
+                data = isa.words_to_bytes(self.instr_mem)
+            elif program.packed and program.map is not None:
+                data = program.map
+            else:
+                data = isa.words_to_bytes(program.word(i) for i in range(len(program)))
+            self.digest = hashlib.sha256(data).digest()
+        return self.digest
+
+    def run(self, trace, stop_at=None):
+        """Execute the loaded program from the PC, passing the state AFTER each
+        instruction execution to trace.step(pc, registers, rd). Stops early,
+        without halting, once `stop_at` instructions have been executed (at
+        once if that many already have)."""
+        if self.program is not None:
+            return self.run_lazy(trace, stop_at)
+        code = self.code
+        if code is None:
+            code = self.code = [None] * len(self.decoded)
+        R = self.registers
+        M = self.memory
+        program_len = len(code)
+        step = trace.step
+        pc = self.pc
+        steps = self.steps
+        limit = NO_LIMIT if stop_at is None else stop_at
+        while steps < limit:
+            index = pc // 4
+            if index < 0 or index >= program_len:
+                self.halted = True
+                break
+            entry = code[index]
+            if entry is None:
+                entry = code[index] = bind(self.handlers[index], self.decoded[index])
+            op, rd, halts = entry
+            pc = op(R, M, pc)
+            R[0] = 0
+            step(pc, R, rd)
+            steps += 1
+            # Virtual Halt (beq x0,x0,0)
+            if halts:
+                self.halted = True
+                break
+        self.pc = pc
+        self.steps = steps
+
+    def run_lazy(self, trace, stop_at=None):
+        """run() for a lazily loaded program: fetches go through the
+        program's decode cache, filling a slot on a miss."""
+        program = self.program
+        tags = program.tags
+        decoded = program.decoded_slots
+        handlers = program.handler_slots
+        mask = program.mask
+        fill = program.fill
+        program_len = program.length
+        R = self.registers
+        M = self.memory
+        step = trace.step
+        pc = self.pc
+        steps = self.steps
+        limit = NO_LIMIT if stop_at is None else stop_at
+        while steps < limit:
+            index = pc // 4
+            if index < 0 or index >= program_len:
+                self.halted = True
+                break
+            slot = index & mask
+            if tags[slot] != index:
+                fill(index)
+            handler = handlers[slot]
+            d = decoded[slot]
+            pc = handler(R, M, pc, d)
+            R[0] = 0
+            step(pc, R, d.rd)
+            steps += 1
+            # Virtual Halt (beq x0,x0,0)
+            if handler is op_halt:
+                self.halted = True
+                break
+        self.pc = pc
+        self.steps = steps
+
+    def run_profiled(self, trace, profile, stop_at=None):
+        """run() that also counts executions and taken control transfers per
+        instruction into a profiler.Profile. A separate loop, so that run()
+        itself pays nothing for profiling."""
+        R = self.registers
+        M = self.memory
+        decoded = self.decoded
+        handlers = self.handlers
+        program_len = len(decoded)
+        counts = profile.counts
+        taken = profile.taken
+        step = trace.step
+        pc = self.pc
+        steps = self.steps
+        limit = NO_LIMIT if stop_at is None else stop_at
+        while steps < limit:
+            index = pc // 4
+            if index < 0 or index >= program_len:
+                self.halted = True
+                break
+            handler = handlers[index]
+            d = decoded[index]
+            next_pc = handler(R, M, pc, d)
+            R[0] = 0
+            counts[index] += 1
+            if next_pc != pc + 4:
+                taken[index] += 1
+            pc = next_pc
+            step(pc, R, d.rd)
+            steps += 1
+            # Virtual Halt (beq x0,x0,0)
+            if handler is op_halt:
+                self.halted = True
+                break
+        self.pc = pc
+        self.steps = steps
+
+    def run_blocks(self, trace, stop_at=None):
+        """Like run(), but executes whole compiled basic blocks. A block that
+        would run past `stop_at` is left to run() instead."""
+        if self.blocks is None:
+            self.blocks = BlockCache(self.decoded, self.handlers)
+        cache = self.blocks
+        R = self.registers
+        M = self.memory
+        program_len = len(self.decoded)
+        step = trace.step
+        pc = self.pc
+        steps = self.steps
+        while True:
+            index = pc // 4
+            if index < 0 or index >= program_len:
+                self.halted = True
+                break
+            block = cache.get(index)
+            if stop_at is not None and steps + (block.end - block.start) > stop_at:
+                self.pc = pc
+                self.steps = steps
+                return self.run(trace, stop_at)
+            pc = block.run(R, M, step)
+            steps += block.end - block.start
+            if block.halts:
+                self.halted = True
                 break
+        self.pc = pc
+        self.steps = steps
+
+    def execute(self, trace, jit=False, stop_at=None, checkpoint_every=None, checkpoint_dir=None,
+                profile=None):
+        """Run until the program halts or `stop_at` steps have executed,
+        saving a checkpoint into checkpoint_dir every checkpoint_every steps.
+        With a profiler.Profile the profiling loop is used (never the JIT)."""
+        if profile is not None:
+            def run(trace, stop_at):
+                self.run_profiled(trace, profile, stop_at)
+        else:
+            run = self.run_blocks if jit else self.run
+        if checkpoint_every:
+            import checkpoint
+        while not self.halted and (stop_at is None or self.steps < stop_at):
+            target = stop_at
+            if checkpoint_every:
+                next_checkpoint = (self.steps // checkpoint_every + 1) * checkpoint_every
+                target = next_checkpoint if stop_at is None else min(stop_at, next_checkpoint)
+            run(trace, target)
+            if checkpoint_every and not self.halted and self.steps % checkpoint_every == 0:
+                trace.flush()
+                checkpoint.save(checkpoint.path_for(checkpoint_dir, self.steps), self)
+
+class StepLimitExceeded(RuntimeError):
+    """simulate() executed max_steps instructions without the program halting."""
+
+# Trace output formats: name -> sink factory taking the trace file path.
+TRACE_FORMATS = {
+    'text': TextTrace,
+    'bin': BinaryTrace,
+    'bin-changed': lambda path: BinaryTrace(path, changed_only=True),
+    'delta': DeltaTrace,
+}
+
+# Default checkpoint directory: the machine code file name plus this suffix.
+CHECKPOINT_SUFFIX = '.checkpoints'
+# Default source map for --profile: the machine code file name plus this suffix.
+SOURCE_MAP_SUFFIX = '.map'
+
+def simulate(binary_file, trace_file, jit=False, trace_format='text', memory=None, lazy=False,
+             checkpoint_every=None, checkpoint_dir=None, resume=False, start_at_step=None,
+             profile=None, source_map=None, max_steps=None):
+    """Run binary_file on a fresh Machine and write its trace. `memory` is an
+    empty Memory to use instead of the default 32-word data memory; `lazy`
+    memory-maps the program and decodes it on demand.
+
+    With checkpoint_every=N a checkpoint is saved into checkpoint_dir every N
+    steps. resume=True continues from the latest checkpoint there;
+    start_at_step=N restores the nearest checkpoint at or before step N (if
+    any) and runs to step N with tracing off, so the trace starts with the
+    state after step N + 1.
+
+    profile is a path ("-" for stdout) for a profiler report of the traced
+    part of the run; source_map is the map written by Assembler.py
+    --source-map (default: binary_file + ".map" if it exists).
 
-        new_pc = None
-        if opcode == "0110011":
-            execute_R(inst)
-        elif opcode in ["0010011", "0000011", "1100111"]:
-            new_pc = execute_I(inst, opcode)
-        elif opcode == "0100011":
-            execute_S(inst)
-        elif opcode == "1100011":
-            branch, imm_val = execute_B(inst)
-            if branch:
-                new_pc = PC + imm_val
-        elif opcode == "1101111":
-            imm_val = execute_J(inst)
-            new_pc = PC + imm_val
-
-        update_x0()
-        if new_pc is not None:
-            PC = new_pc
+    With max_steps=N the run is abandoned after N instructions if the
+    program has not halted by then: the trace keeps the steps executed so
+    far, has no memory dump, and StepLimitExceeded is raised. That happens
+    without running anything if a resumed checkpoint is already past N, and
+    a fast-forward with start_at_step stops at N too.
+    Returns the Machine in its final state."""
+    machine = Machine(memory)
+    machine.load(binary_file, lazy=lazy)
+    if checkpoint_dir is None:
+        checkpoint_dir = binary_file + CHECKPOINT_SUFFIX
+    if resume or start_at_step is not None:
+        import checkpoint
+        path = checkpoint.latest(checkpoint_dir, start_at_step)
+        if path is not None:
+            checkpoint.restore(path, machine)
+        elif resume:
+            raise FileNotFoundError(f"no checkpoint in {checkpoint_dir}")
+        if start_at_step is not None:
+            fast_forward = start_at_step if max_steps is None else min(start_at_step, max_steps)
+            machine.execute(NullTrace(), jit, fast_forward, checkpoint_every, checkpoint_dir)
+    counters = None
+    if profile is not None:
+        import profiler
+        counters = profiler.Profile(len(machine.decoded))
+    with TRACE_FORMATS[trace_format](trace_file) as trace:
+        machine.execute(trace, jit, max_steps, checkpoint_every=checkpoint_every,
+                        checkpoint_dir=checkpoint_dir, profile=counters)
+        if not machine.halted:
+            raise StepLimitExceeded(f"{binary_file}: no halt within {max_steps} steps "
+                                    f"(stopped at step {machine.steps})")
+        trace.close(machine.memory.dump(), machine.memory.dump_label)
+    if profile is not None:
+        if source_map is None and os.path.exists(binary_file + SOURCE_MAP_SUFFIX):
+            source_map = binary_file + SOURCE_MAP_SUFFIX
+        words = profiler.load_source_map(source_map) if source_map is not None else None
+        text = profiler.report(counters, machine.decoded, words)
+        if profile == '-':
+            print(text, end='')
         else:
-            PC += 4
-        # Record state after instruction execution: PC and registers (in decimal)
-        trace_lines.append(f"{PC} " + " ".join(str(reg) for reg in REGISTERS))
-
-    # Write trace lines to output file
-    with open(trace_file, 'w') as f:
-        for line in trace_lines:
-            f.write(line + "\n")
-        # Memory dump: print addresses (starting at 0x00010000) and memory words in decimal.
-        mem_addr = 0x00010000
-        for word in MEMORY:
-            f.write(f"0x{mem_addr:08X}:{word}\n")
-            mem_addr += 4
+            with open(profile, 'w') as f:
+                f.write(text)
+    return machine
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 Simulator.py <input_machine_code_file.txt> <output_trace_file.txt>")
-        sys.exit(1)
-    binary_file = sys.argv[1]
-    trace_file = sys.argv[2]
-    simulate(binary_file, trace_file)
+    parser = argparse.ArgumentParser(usage="python3 Simulator.py <input_machine_code_file.txt|.bin> <output_trace_file.txt> [options]")
+    parser.add_argument("binary_file")
+    parser.add_argument("trace_file")
+    parser.add_argument("--jit", action="store_true", help="execute compiled basic blocks instead of one instruction at a time")
+    parser.add_argument("--lazy", action="store_true",
+                        help="memory-map the program and decode instructions when first reached "
+                             "(every line of a text program must be exactly 32 characters)")
+    parser.add_argument("--trace-format", choices=TRACE_FORMATS, default="text",
+                        help="trace file format; binary traces can be rendered with tracefile.py")
+    parser.add_argument("--mem-base", type=lambda x: int(x, 0), default=0,
+                        help="lowest valid data address (default 0)")
+    parser.add_argument("--mem-size", type=lambda x: int(x, 0),
+                        help="size of the data address space in bytes, e.g. 0x100000000; "
+                             "without it the 32-word legacy memory is used")
+    parser.add_argument("--dump-base", type=lambda x: int(x, 0),
+                        help="first address of the memory dump (default --mem-base)")
+    parser.add_argument("--dump-words", type=int, default=32,
+                        help="number of words in the memory dump (default 32)")
+    parser.add_argument("--checkpoint-every", type=int, metavar="N",
+                        help="save a checkpoint of the machine state every N steps")
+    parser.add_argument("--checkpoint-dir",
+                        help=f"directory for checkpoints (default <binary_file>{CHECKPOINT_SUFFIX})")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the latest checkpoint instead of step 0")
+    parser.add_argument("--start-at-step", type=int, metavar="N",
+                        help="fast-forward to step N from the nearest checkpoint with tracing off, "
+                             "then trace the rest of the run")
+    parser.add_argument("--profile", metavar="REPORT",
+                        help='write an execution profile (hot blocks, opcode classes, branches) '
+                             'to REPORT, or "-" for stdout')
+    parser.add_argument("--source-map",
+                        help=f"PC -> source map from Assembler.py --source-map "
+                             f"(default <binary_file>{SOURCE_MAP_SUFFIX} if present)")
+    parser.add_argument("--max-steps", type=int, metavar="N",
+                        help="give up (exit status 3, no memory dump) if the program has not halted "
+                             "after N instructions")
+    # Extra positional arguments (the graders pass a third one) are ignored.
+    args, _ = parser.parse_known_args()
+    memory = None
+    if args.mem_size is not None:
+        memory = Memory(args.mem_base, args.mem_size, args.dump_base, args.dump_words)
+    try:
+        simulate(args.binary_file, args.trace_file, jit=args.jit, trace_format=args.trace_format,
+                 memory=memory, lazy=args.lazy, checkpoint_every=args.checkpoint_every,
+                 checkpoint_dir=args.checkpoint_dir, resume=args.resume, start_at_step=args.start_at_step,
+                 profile=args.profile, source_map=args.source_map, max_steps=args.max_steps)
+    except StepLimitExceeded as e:
+        parser.exit(3, f"Simulator.py: step limit exceeded: {e}\n")
@@ -0,0 +1,297 @@
+"""Batched simulation for Simulator.py: one program, many initial states.
+
+BatchMachine runs N lanes of the same binary side by side. The register
+files are an N x 32 uint32 array and the data memories an N x words uint32
+array, so every lane has its own registers and memory. Each step, the active
+lanes are grouped by PC and every group executes its instruction with one
+vectorized operation; lanes whose branches go different ways simply end up
+in different groups on the next step, and lanes that halt or leave the
+program are masked off. Each lane writes its own trace, identical to the one
+simulate() writes for the same initial state.
+
+Requires NumPy:
+
+    python3 batch.py program.txt "trace_{lane}.txt" --lanes 4 --reg a0=1,2,3,4
+"""
+
+import argparse
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is only needed for batched runs
+    np = None
+
+import Simulator
+from Assembler import REGISTERS as REGISTER_NAMES
+from isa import MASK32
+from memory import Memory
+
+
+# Vectorized execute kernels, keyed by handler name. Each takes the register
+# array R, the memory array M, the lane indices, the group's PC and the
+# Decoded record, updates the lanes in place and returns their next PC
+# (a scalar or one value per lane). `machine` gives access to the memory
+# bounds for lw/sw.
+
+def _add(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] + R[lanes, d.rs2]
+    return pc + 4
+
+def _sub(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] - R[lanes, d.rs2]
+    return pc + 4
+
+def _slt(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] < R[lanes, d.rs2]
+    return pc + 4
+
+def _srl(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] >> (R[lanes, d.rs2] & np.uint32(0x1F))
+    return pc + 4
+
+def _or(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] | R[lanes, d.rs2]
+    return pc + 4
+
+def _and(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] & R[lanes, d.rs2]
+    return pc + 4
+
+def _addi(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = R[lanes, d.rs1] + np.uint32(d.imm & MASK32)
+    return pc + 4
+
+def _lw(machine, R, M, lanes, pc, d):
+    index, ok = machine.word_index(R[lanes, d.rs1].astype(np.int64) + d.imm)
+    # Only in-range lanes index M, which has no columns at all for an empty region.
+    value = np.zeros(lanes.size, dtype=np.uint32)
+    value[ok] = M[lanes[ok], index[ok]]
+    R[lanes, d.rd] = value
+    return pc + 4
+
+def _sw(machine, R, M, lanes, pc, d):
+    index, ok = machine.word_index(R[lanes, d.rs1].astype(np.int64) + d.imm)
+    M[lanes[ok], index[ok]] = R[lanes[ok], d.rs2]
+    return pc + 4
+
+def _beq(machine, R, M, lanes, pc, d):
+    return np.where(R[lanes, d.rs1] == R[lanes, d.rs2], pc + d.imm, pc + 4)
+
+def _bne(machine, R, M, lanes, pc, d):
+    return np.where(R[lanes, d.rs1] != R[lanes, d.rs2], pc + d.imm, pc + 4)
+
+def _blt(machine, R, M, lanes, pc, d):
+    return np.where(R[lanes, d.rs1] < R[lanes, d.rs2], pc + d.imm, pc + 4)
+
+def _jal(machine, R, M, lanes, pc, d):
+    R[lanes, d.rd] = (pc + 4) & MASK32
+    return pc + d.imm
+
+def _jalr(machine, R, M, lanes, pc, d):
+    target = (R[lanes, d.rs1].astype(np.int64) + d.imm) & 0xFFFFFFFE
+    R[lanes, d.rd] = pc + 4
+    return target
+
+def _next(machine, R, M, lanes, pc, d):
+    return pc + 4
+
+KERNELS = {
+    'op_add': _add, 'op_sub': _sub, 'op_slt': _slt, 'op_srl': _srl,
+    'op_or': _or, 'op_and': _and, 'op_addi': _addi,
+    'op_lw': _lw, 'op_sw': _sw,
+    'op_beq': _beq, 'op_bne': _bne, 'op_blt': _blt,
+    'op_jal': _jal, 'op_jalr': _jalr,
+    'op_nop': _next, 'op_halt': _next,
+}
+
+
+class _LaneMemory:
+    """Memory interface over one lane's row, for handlers without a kernel."""
+    __slots__ = ('machine', 'lane')
+
+    def __init__(self, machine, lane):
+        self.machine = machine
+        self.lane = lane
+
+    def load(self, addr):
+        return self.machine.load_word(self.lane, addr)
+
+    def store(self, addr, value):
+        self.machine.store_word(self.lane, addr, value)
+
+
+class BatchMachine:
+    """N lanes of one program, each with its own registers, memory and PC.
+
+    `memory` is a Memory describing the address space, dump region and dump
+    label shared by all lanes (the 32-word legacy memory by default); the
+    lanes' memories are dense, so its size must fit N times in RAM."""
+    __slots__ = ('lanes', 'registers', 'memory', 'pc', 'active', 'steps',
+                 'decoded', 'handlers', 'base', 'limit', 'word_base', 'layout')
+
+    def __init__(self, lanes, memory=None):
+        if np is None:
+            raise ImportError("batched simulation needs NumPy (pip install numpy)")
+        layout = Memory.legacy() if memory is None else memory
+        self.lanes = lanes
+        self.layout = layout
+        self.base = layout.base
+        self.limit = layout.limit
+        self.word_base = layout.base >> 2
+        words = ((layout.limit - 1) >> 2) - self.word_base + 1 if layout.limit > layout.base else 0
+        self.registers = np.zeros((lanes, 32), dtype=np.uint32)
+        self.memory = np.zeros((lanes, words), dtype=np.uint32)
+        self.pc = np.zeros(lanes, dtype=np.int64)
+        self.active = np.ones(lanes, dtype=bool)
+        self.steps = 0              # Steps executed by every lane still running
+        self.decoded = []
+        self.handlers = []
+
+    def load(self, binary_file):
+        """Load a machine code file and reset every lane's PC to 0."""
+        _, self.decoded, self.handlers = Simulator.load_program(binary_file)
+        self.pc[:] = 0
+        self.active[:] = True
+        self.steps = 0
+
+    def word_index(self, addr):
+        """Memory column and in-range mask for an int64 array of byte addresses."""
+        ok = (addr >= self.base) & (addr < self.limit)
+        return (addr >> 2) - self.word_base, ok
+
+    def load_word(self, lane, addr):
+        if self.base <= addr < self.limit:
+            return int(self.memory[lane, (addr >> 2) - self.word_base])
+        return 0
+
+    def store_word(self, lane, addr, value):
+        if self.base <= addr < self.limit:
+            self.memory[lane, (addr >> 2) - self.word_base] = value
+
+    def dump(self, lane):
+        """The words of the dump region of one lane, like Memory.dump()."""
+        start = self.layout.dump_base
+        return [self.load_word(lane, start + 4 * i) for i in range(self.layout.dump_words)]
+
+    def run(self, traces, stop_at=None):
+        """Step all lanes together until every lane has halted or left the
+        program, passing each lane's state after every instruction to
+        traces[lane].step(pc, registers, rd). Stops early once `stop_at`
+        steps have been executed, leaving the lanes still running active."""
+        R = self.registers
+        M = self.memory
+        pc = self.pc
+        active = self.active
+        decoded = self.decoded
+        handlers = self.handlers
+        program_len = len(decoded)
+        steps = [trace.step for trace in traces]
+        limit = Simulator.NO_LIMIT if stop_at is None else stop_at
+        while self.steps < limit:
+            active &= (pc >= 0) & (pc // 4 < program_len)
+            running = np.flatnonzero(active)
+            if not running.size:
+                break
+            group_pcs, group_of = np.unique(pc[running], return_inverse=True)
+            rds = np.zeros(self.lanes, dtype=np.int64)
+            for g, group_pc in enumerate(group_pcs.tolist()):
+                lanes = running[group_of == g]
+                handler = handlers[group_pc // 4]
+                d = decoded[group_pc // 4]
+                kernel = KERNELS.get(handler.__name__)
+                if kernel is not None:
+                    pc[lanes] = kernel(self, R, M, lanes, group_pc, d)
+                else:
+                    self._call(handler, lanes, group_pc, d)
+                rds[lanes] = d.rd
+                # Virtual Halt (beq x0,x0,0)
+                if handler is Simulator.op_halt:
+                    active[lanes] = False
+            R[:, 0] = 0
+            rows = R[running].tolist()
+            for lane, row, next_pc, rd in zip(running.tolist(), rows,
+                                             pc[running].tolist(), rds[running].tolist()):
+                steps[lane](next_pc, row, rd)
+            self.steps += 1
+
+    def _call(self, handler, lanes, pc, d):
+        # A handler with no kernel runs one lane at a time on a list copy.
+        for lane in lanes.tolist():
+            row = self.registers[lane].tolist()
+            self.pc[lane] = handler(row, _LaneMemory(self, lane), pc, d)
+            self.registers[lane] = [value & MASK32 for value in row]
+
+
+def simulate_batch(binary_file, trace_files, registers=None, memory_words=None,
+                   trace_format='text', memory=None, max_steps=None):
+    """Run binary_file once per trace file, all lanes together.
+
+    registers[lane] is an optional list of 32 initial register values and
+    memory_words[lane] an optional {address: word} dict of initial memory;
+    every other lane state starts at zero as in simulate(). With
+    max_steps=N the run stops after N steps; as in simulate(), the lanes
+    that have not halted by then get no memory dump and
+    Simulator.StepLimitExceeded is raised once every trace is written.
+    Returns the BatchMachine in its final state."""
+    machine = BatchMachine(len(trace_files), memory)
+    machine.load(binary_file)
+    for lane in range(machine.lanes):
+        if registers is not None and registers[lane] is not None:
+            machine.registers[lane] = [value & MASK32 for value in registers[lane]]
+            machine.registers[lane, 0] = 0
+        if memory_words is not None and memory_words[lane]:
+            for addr, value in memory_words[lane].items():
+                machine.store_word(lane, addr, value & MASK32)
+
+    traces = [Simulator.TRACE_FORMATS[trace_format](path) for path in trace_files]
+    try:
+        machine.run(traces, max_steps)
+        for lane, trace in enumerate(traces):
+            if not machine.active[lane]:
+                trace.close(machine.dump(lane), machine.layout.dump_label)
+    finally:
+        for trace in traces:
+            trace.close()
+    running = np.flatnonzero(machine.active).tolist()
+    if running:
+        raise Simulator.StepLimitExceeded(f"{binary_file}: lanes {running} did not halt within "
+                                          f"{max_steps} steps")
+    return machine
+
+
+def _register(name):
+    name = name.strip()
+    if name in REGISTER_NAMES:
+        return REGISTER_NAMES[name]
+    number = int(name[1:] if name.startswith('x') else name)
+    if not 0 <= number < 32:
+        raise ValueError(name)
+    return number
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run one binary for many initial register values.")
+    parser.add_argument('binary_file')
+    parser.add_argument('trace_pattern', help="trace file name containing {lane}, e.g. trace_{lane}.txt")
+    parser.add_argument('--lanes', type=int, required=True)
+    parser.add_argument('--reg', action='append', default=[], metavar='REG=V0,V1,...',
+                        help="initial value of REG in each lane (one value per lane)")
+    parser.add_argument('--trace-format', choices=Simulator.TRACE_FORMATS, default='text')
+    parser.add_argument('--max-steps', type=int, metavar='N',
+                        help="give up (exit status 3) on the lanes that have not halted after N steps")
+    args = parser.parse_args()
+
+    registers = [[0] * 32 for _ in range(args.lanes)]
+    for spec in args.reg:
+        name, _, values = spec.partition('=')
+        values = [int(v, 0) for v in values.split(',')]
+        if len(values) != args.lanes:
+            parser.error(f"--reg {name}: expected {args.lanes} values, got {len(values)}")
+        for lane, value in enumerate(values):
+            registers[lane][_register(name)] = value
+    trace_files = [args.trace_pattern.format(lane=lane) for lane in range(args.lanes)]
+    try:
+        simulate_batch(args.binary_file, trace_files, registers=registers, trace_format=args.trace_format,
+                       max_steps=args.max_steps)
+    except Simulator.StepLimitExceeded as e:
+        parser.exit(3, f"batch.py: step limit exceeded: {e}\n")
@@ -0,0 +1,132 @@
+"""Microbenchmark: assembler throughput on generated sources.
+
+Assembles two synthetic programs in memory and reports source lines per
+second: a "repetitive" one built from a handful of distinct lines, as
+generated code tends to be, and a "varied" one where almost every line is
+unique. Each is timed as the assembler runs by default, with the parse
+cache forced on, and with it bypassed.
+
+To compare against another version of the assembler (e.g. a checkout of an
+older commit), point --root at its directory; versions without a parse
+cache are only timed once.
+
+Usage: python3 benchmarks/bench_assembler.py [--lines N] [--repeat N] [--root DIR]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REGS = ['zero', 'ra', 'sp', 't0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3']
+
+
+def repetitive_source(n):
+    """Unrolled loop bodies: the same few lines over and over, plus labels."""
+    body = ['addi t0,t0,1', 'lw t1,0(sp)', 'add t2,t1,t0', 'sw t2,4(sp)',
+            'sub a0,a0,t0', 'or a1,a1,t2', 'slt a2,t0,a0']
+    lines = []
+    while len(lines) < n:
+        k = len(lines)
+        lines.append(f'L{k}: ' + body[0])
+        lines.extend(body[1:])
+        lines.append(f'blt t0,a0,L{k}')
+        lines.append(f'jal ra,L{k + len(body) + 2}')
+    lines.append(f'L{len(lines)}: beq zero,zero,0')
+    return lines
+
+
+def varied_source(n, seed=1):
+    """Random operands and immediates, so nearly every line is distinct."""
+    rng = random.Random(seed)
+    lines = []
+    defined = [0]       # label numbers defined so far, so branches go backwards
+    for k in range(n):
+        r = lambda: rng.choice(REGS)
+        kind = rng.randrange(6)
+        if kind == 0:
+            lines.append(f'{rng.choice(["add", "sub", "slt", "srl", "or", "and"])} {r()},{r()},{r()}')
+        elif kind == 1:
+            lines.append(f'addi {r()},{r()},{rng.randint(-2048, 2047)}')
+        elif kind == 2:
+            lines.append(f'lw {r()},{rng.randint(-512, 511) * 4}({r()})')
+        elif kind == 3:
+            lines.append(f'sw {r()},{rng.randint(-512, 511) * 4}({r()})')
+        elif kind == 4:
+            lines.append(f'L{k}: bne {r()},{r()},L{rng.choice(defined[-64:])}')
+            defined.append(k)
+        else:
+            lines.append(f'jal ra,{rng.randint(-1000, 1000) * 4}')
+    lines.insert(0, 'L0: addi zero,zero,0')
+    lines.append('beq zero,zero,0')
+    return lines
+
+
+def time_assemble(Assembler, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            Assembler.Assembler().assemble(lines)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def cache_modes(Assembler):
+    """(default, always cached, never cached) patches for this Assembler
+    module, None where the version has no such mode."""
+    cached = getattr(Assembler, 'parse_instruction', None)
+    if cached is None:
+        return contextlib.nullcontext(), None, None
+    if not hasattr(Assembler, 'choose_parser'):
+        # Cache always on, before the hit rate check.
+        return contextlib.nullcontext(), None, patched(Assembler, parse_instruction=cached.__wrapped__)
+    return (contextlib.nullcontext(),
+            patched(Assembler, choose_parser=lambda hits: cached),
+            patched(Assembler, choose_parser=lambda hits: Assembler.parse_line, PARSE_SAMPLE=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--root', default=ROOT, help="directory holding the Assembler.py to time")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.root))
+    import Assembler
+
+    print(f"{'source':<12}{'lines':>9}{'default lines/s':>18}{'cached lines/s':>17}{'uncached lines/s':>19}")
+    for name, lines in (('repetitive', repetitive_source(args.lines)), ('varied', varied_source(args.lines))):
+        rates = []
+        for mode in cache_modes(Assembler):
+            if mode is None:
+                rates.append('')
+                continue
+            if hasattr(Assembler, 'parse_instruction'):
+                Assembler.parse_instruction.cache_clear()
+            with mode:
+                rates.append(f"{time_assemble(Assembler, lines, args.repeat):.0f}")
+        print(f"{name:<12}{len(lines):>9}{rates[0]:>18}{rates[1]:>17}{rates[2]:>19}")
+
+
+if __name__ == '__main__':
+    main()
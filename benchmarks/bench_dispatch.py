@@ -0,0 +1,161 @@
+"""Microbenchmark: dispatch-table simulate loop vs. the old if/elif chain.
+
+Runs every program in tests/bin/simple through Machine.run() and through
+chain_run(), a copy of the loop that selected the execute path with a chain
+of opcode/funct3/funct7 comparisons, and reports executed steps per second.
+Loading is not timed for either loop: the program is pre-decoded once, and
+run()'s bound instructions are kept from one repetition to the next.
+Formatting the trace line of every step costs far more than either loop, so
+--pcs-only records just the PC of each step to time the loops themselves.
+
+Usage: python3 benchmarks/bench_dispatch.py [--repeat N] [--pcs-only] [bin_dir]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Simulator
+from isa import OP_R, OP_ADDI, OP_LW, OP_JALR, OP_S, OP_B, OP_J
+
+
+def chain_run(decoded, R, M, pcs_only=False):
+    """The pre-dispatch loop: if/elif on opcode, then on funct3/funct7."""
+    pc = 0
+    program_len = len(decoded)
+    trace_lines = []
+    while True:
+        index = pc // 4
+        if index < 0 or index >= program_len:
+            break
+        d = decoded[index]
+        opcode = d.opcode
+        if Simulator.is_halt(d):
+            pc += 4
+            R[0] = 0
+            trace_lines.append(pc if pcs_only else f"{pc} " + " ".join(str(reg) for reg in R))
+            break
+        new_pc = None
+        if opcode == OP_R:
+            op1, op2 = R[d.rs1], R[d.rs2]
+            if d.funct3 == 0b000:
+                if d.funct7 == 0b0000000:
+                    R[d.rd] = (op1 + op2) & 0xFFFFFFFF
+                elif d.funct7 == 0b0100000:
+                    R[d.rd] = (op1 - op2) & 0xFFFFFFFF
+            elif d.funct3 == 0b010:
+                R[d.rd] = 1 if op1 < op2 else 0
+            elif d.funct3 == 0b101:
+                R[d.rd] = (op1 & 0xFFFFFFFF) >> (op2 & 0x1F)
+            elif d.funct3 == 0b110:
+                R[d.rd] = op1 | op2
+            elif d.funct3 == 0b111:
+                R[d.rd] = op1 & op2
+        elif opcode == OP_ADDI or opcode == OP_LW or opcode == OP_JALR:
+            op1 = R[d.rs1]
+            if opcode == OP_ADDI:
+                R[d.rd] = (op1 + d.imm) & 0xFFFFFFFF
+            elif opcode == OP_LW:
+                index = (op1 + d.imm) // 4
+                R[d.rd] = M[index] if 0 <= index < len(M) else 0
+            else:
+                R[d.rd] = pc + 4
+                new_pc = (op1 + d.imm) & 0xFFFFFFFE
+        elif opcode == OP_S:
+            index = (R[d.rs1] + d.imm) // 4
+            if 0 <= index < len(M):
+                M[index] = R[d.rs2]
+        elif opcode == OP_B:
+            op1, op2 = R[d.rs1], R[d.rs2]
+            if d.funct3 == 0b000:
+                branch = op1 == op2
+            elif d.funct3 == 0b001:
+                branch = op1 != op2
+            elif d.funct3 == 0b100:
+                branch = op1 < op2
+            else:
+                branch = False
+            if branch:
+                new_pc = pc + d.imm
+        elif opcode == OP_J:
+            R[d.rd] = (pc + 4) & 0xFFFFFFFF
+            new_pc = pc + d.imm
+        R[0] = 0
+        pc = new_pc if new_pc is not None else pc + 4
+        trace_lines.append(pc if pcs_only else f"{pc} " + " ".join(str(reg) for reg in R))
+    return trace_lines
+
+
+class ListTrace:
+    """Trace sink that keeps the formatted lines, like chain_run() does."""
+
+    def __init__(self):
+        self.lines = []
+
+    def step(self, pc, R, rd):
+        self.lines.append(f"{pc} " + " ".join(str(reg) for reg in R))
+
+
+class PCTrace(ListTrace):
+    """Trace sink that keeps only the PC of each step, like chain_run(pcs_only=True)."""
+
+    def step(self, pc, R, rd):
+        self.lines.append(pc)
+
+
+def dispatch_run(decoded, handlers, code, R, pcs_only=False):
+    machine = Simulator.Machine()
+    machine.registers = R
+    machine.decoded, machine.handlers, machine.code = decoded, handlers, code
+    trace = PCTrace() if pcs_only else ListTrace()
+    machine.run(trace)
+    return trace.lines
+
+
+def time_it(fn, repeat):
+    """Steps of one fn() call and its best wall-clock time over `repeat` calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        steps = len(fn())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return steps, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('bin_dir', nargs='?', default=os.path.join(ROOT, 'tests', 'bin', 'simple'))
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--pcs-only', action='store_true', help="record only the PC of each step")
+    args = parser.parse_args()
+    pcs_only = args.pcs_only
+
+    total = {'chain': [0, 0.0], 'dispatch': [0, 0.0]}
+    print(f"{'program':<16}{'steps':>8}{'chain steps/s':>16}{'dispatch steps/s':>18}{'speedup':>9}")
+    for name in sorted(os.listdir(args.bin_dir)):
+        _, decoded, handlers = Simulator.load_program(os.path.join(args.bin_dir, name))
+        code = [None] * len(decoded)
+        if chain_run(decoded, [0] * 32, [0] * 32) != dispatch_run(decoded, handlers, code, [0] * 32):
+            sys.exit(f"{name}: traces differ between loops")
+        results = {
+            'chain': time_it(lambda: chain_run(decoded, [0] * 32, [0] * 32, pcs_only), args.repeat),
+            'dispatch': time_it(lambda: dispatch_run(decoded, handlers, code, [0] * 32, pcs_only), args.repeat),
+        }
+        for key, (steps, secs) in results.items():
+            total[key][0] += steps
+            total[key][1] += secs
+        chain = results['chain'][0] / results['chain'][1]
+        dispatch = results['dispatch'][0] / results['dispatch'][1]
+        print(f"{name:<16}{results['chain'][0]:>8}{chain:>16.0f}{dispatch:>18.0f}{dispatch / chain:>8.2f}x")
+    chain = total['chain'][0] / total['chain'][1]
+    dispatch = total['dispatch'][0] / total['dispatch'][1]
+    print(f"{'total':<16}{'':>8}{chain:>16.0f}{dispatch:>18.0f}{dispatch / chain:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
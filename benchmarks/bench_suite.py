@@ -0,0 +1,221 @@
+"""Benchmark suite: assembler and simulator on synthetic programs.
+
+Generates four programs from the instructions in Assembler.INSTRUCTION_TYPES,
+each ending in the virtual halt:
+
+  straight   long straight-line ALU code, every instruction runs once
+  loop       a tight counted loop closed by blt/bne
+  memory     a loop of lw/add/sw over the 32-word data memory
+  call       a loop calling a small function with jal and returning with jalr
+
+and runs each through Assembler.assembler() and Simulator.simulate(), the
+entry points the graders call. For each stage it reports instructions per
+second (words emitted by the assembler, steps executed by the simulator),
+the best wall-clock time over --repeat runs, the tracemalloc peak of one
+extra run, and the size of the file written. The loop programs are only a
+few instructions long, so their assembler figures are mostly fixed cost;
+"straight" is the one that measures assembler throughput.
+
+--json writes the results to a file; --compare prints the speed and memory
+of this run relative to such a file, e.g. one saved before a change. To time
+another version of the tools, point --root at its directory.
+
+Usage: python3 benchmarks/bench_suite.py [--scale X] [--repeat N] [--root DIR]
+                                         [--json OUT] [--compare OLD]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ALU = ['add', 'sub', 'slt', 'srl', 'or', 'and']
+REGS = ['t0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+
+# Loop counts are built from addi immediates, so larger counts nest two loops.
+MAX_COUNT = 2000
+
+# Steps (straight: instructions) of each program at --scale 1.
+SIZES = {'straight': 20000, 'loop': 200000, 'memory': 100000, 'call': 100000}
+
+
+def counted_loop(name, body, iterations):
+    """body (a list of instructions, none using s10/s11/t5/t6) repeated
+    `iterations` times, as an inner loop of up to MAX_COUNT passes nested in
+    an outer one. Every label is on an instruction line."""
+    outer = max(1, -(-iterations // MAX_COUNT))
+    inner = max(1, -(-iterations // outer))
+    return [
+        f'addi s11,zero,{outer}',
+        'addi s10,zero,0',
+        f'{name}_outer: addi t6,zero,{inner}',
+        'addi t5,zero,0',
+        f'{name}_inner: {body[0]}',
+        *body[1:],
+        'addi t5,t5,1',
+        f'blt t5,t6,{name}_inner',
+        'addi s10,s10,1',
+        f'bne s10,s11,{name}_outer',
+    ]
+
+
+def straight_program(n, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        if rng.randrange(4):
+            lines.append(f'{rng.choice(ALU)} {rng.choice(REGS)},{rng.choice(REGS)},{rng.choice(REGS)}')
+        else:
+            lines.append(f'addi {rng.choice(REGS)},{rng.choice(REGS)},{rng.randint(-2048, 2047)}')
+    lines.append('beq zero,zero,0')
+    return lines
+
+
+def loop_program(steps):
+    body = ['add a0,a0,t5', 'sub a1,a1,a0', 'or a2,a2,a1', 'and a3,a3,a2']
+    lines = counted_loop('loop', body, steps // (len(body) + 2))
+    lines.append('beq zero,zero,0')
+    return lines
+
+
+def memory_program(steps):
+    # One pass walks the 32 words of the legacy data memory (addresses 0-124).
+    body = ['lw a0,0(t2)', 'add a0,a0,t5', 'sw a0,0(t2)', 'lw a1,4(t2)', 'add a1,a1,a0',
+            'sw a1,4(t2)', 'addi t2,t2,8', 'and t2,t2,t3']
+    lines = ['addi t3,zero,127']
+    lines += counted_loop('mem', body, steps // (len(body) + 2))
+    lines.append('beq zero,zero,0')
+    return lines
+
+
+def call_program(steps):
+    body = ['jal ra,func', 'add s0,s0,a0']
+    lines = counted_loop('call', body, steps // (len(body) + 2 + 4))
+    lines.append('beq zero,zero,0')
+    lines += ['func: addi a0,a0,3', 'srl a1,a0,t5', 'sub a0,a0,a1', 'jalr zero,ra,0']
+    return lines
+
+
+WORKLOADS = {
+    'straight': straight_program,
+    'loop': loop_program,
+    'memory': memory_program,
+    'call': call_program,
+}
+
+
+def measure(run, repeat):
+    """Best wall-clock time of run() over `repeat` calls, then the tracemalloc
+    peak of one more call (separately, as tracing slows the run down)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def bench_workload(Assembler, Simulator, name, size, repeat, directory):
+    source = os.path.join(directory, name + '.s')
+    binary = os.path.join(directory, name + '.txt')
+    trace = os.path.join(directory, name + '.trace')
+    lines = WORKLOADS[name](size)
+    with open(source, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    def assemble():
+        with contextlib.redirect_stdout(io.StringIO()):
+            Assembler.assembler(source, binary)
+
+    def simulate():
+        return Simulator.simulate(binary, trace)
+
+    asm_time, asm_peak = measure(assemble, repeat)
+    with open(binary) as f:
+        words = sum(1 for line in f if line.strip())
+    machine = simulate()
+    steps = getattr(machine, 'steps', None)
+    if steps is None:       # versions whose simulate() returns nothing
+        with open(trace) as f:
+            steps = sum(1 for line in f if line.strip() and not line.startswith('0x'))
+    sim_time, sim_peak = measure(simulate, repeat)
+    return {
+        'source_lines': len(lines),
+        'assembler': {'instructions': words, 'seconds': asm_time, 'instr_per_sec': words / asm_time,
+                      'peak_bytes': asm_peak, 'output_bytes': os.path.getsize(binary)},
+        'simulator': {'instructions': steps, 'seconds': sim_time, 'instr_per_sec': steps / sim_time,
+                      'peak_bytes': sim_peak, 'output_bytes': os.path.getsize(trace)},
+    }
+
+
+def print_results(results, baseline=None):
+    header = f"{'workload':<10}{'stage':<11}{'instr':>9}{'instr/s':>12}{'peak KiB':>10}{'out KiB':>10}"
+    if baseline is not None:
+        header += f"{'speed':>8}{'peak':>8}"
+    print(header)
+    for name, workload in results['workloads'].items():
+        for stage in ('assembler', 'simulator'):
+            r = workload[stage]
+            row = (f"{name:<10}{stage:<11}{r['instructions']:>9}{r['instr_per_sec']:>12.0f}"
+                   f"{r['peak_bytes'] / 1024:>10.0f}{r['output_bytes'] / 1024:>10.0f}")
+            old = None if baseline is None else baseline['workloads'].get(name, {}).get(stage)
+            if old is not None:
+                row += f"{r['instr_per_sec'] / old['instr_per_sec']:>7.2f}x"
+                row += f"{r['peak_bytes'] / max(old['peak_bytes'], 1):>7.2f}x"
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every program size by X")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                        help="run only this workload (repeatable)")
+    parser.add_argument('--root', default=ROOT, help="directory holding the Assembler.py and Simulator.py to time")
+    parser.add_argument('--json', metavar='OUT', help="write the results to OUT as JSON")
+    parser.add_argument('--compare', metavar='OLD', help="show speed and peak memory relative to OLD (a --json file)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.root))
+    import Assembler
+    import Simulator
+
+    results = {
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'workloads': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.workload or WORKLOADS:
+            size = max(1, int(SIZES[name] * args.scale))
+            results['workloads'][name] = bench_workload(Assembler, Simulator, name, size, args.repeat, directory)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
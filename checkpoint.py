@@ -0,0 +1,104 @@
+"""Machine snapshots for Simulator.py.
+
+A checkpoint holds everything needed to continue a run: the step count,
+PC, register file and every allocated memory page. The file is MAGIC, a
+little-endian u16 format version, then a zlib-compressed body:
+
+    u64 steps, i64 pc, u32 program length, 32-byte SHA-256 of the program
+    (Machine.program_digest),
+    u64 memory base, u64 memory limit, u32 page count,
+    32 x u32 registers,
+    per page: u32 page number, PAGE_WORDS x u32 words
+
+Checkpoints of one run are kept in a directory, one file per step count
+(path_for), so the nearest one before any step is found from the names
+alone (latest).
+"""
+
+import os
+import re
+import struct
+import zlib
+
+import isa
+from memory import PAGE_WORDS
+
+MAGIC = b'RVCKPT\0\0'
+VERSION = 2
+
+HEADER = struct.Struct('<QqI32sQQI32I')
+PAGE_NUMBER = struct.Struct('<I')
+NAME = re.compile(r'step_(\d+)\.ckpt$')
+
+
+def path_for(directory, steps):
+    return os.path.join(directory, f'step_{steps:012d}.ckpt')
+
+
+def latest(directory, at_most=None):
+    """Path of the checkpoint with the most steps (at most `at_most`), or None."""
+    best = None
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        match = NAME.match(name)
+        if match is None:
+            continue
+        steps = int(match.group(1))
+        if (at_most is None or steps <= at_most) and (best is None or steps > best[0]):
+            best = (steps, name)
+    return None if best is None else os.path.join(directory, best[1])
+
+
+def save(path, machine):
+    """Write a checkpoint of `machine` to path (atomically)."""
+    memory = machine.memory
+    pages = sorted(memory.pages.items())
+    body = bytearray(HEADER.pack(machine.steps, machine.pc, len(machine.decoded), machine.program_digest(),
+                                 memory.base, memory.limit, len(pages), *machine.registers))
+    for number, page in pages:
+        body += PAGE_NUMBER.pack(number)
+        body += isa.words_to_bytes(page)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<H', VERSION))
+        f.write(zlib.compress(bytes(body), 1))
+    os.replace(tmp, path)
+
+
+def restore(path, machine):
+    """Load a checkpoint into `machine`, which must already hold the same
+    program and a memory with the same bounds."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: not a checkpoint")
+    version, = struct.unpack_from('<H', data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported checkpoint version {version}")
+    body = zlib.decompress(data[len(MAGIC) + 2:])
+    steps, pc, program_len, digest, base, limit, page_count, *registers = HEADER.unpack_from(body)
+    memory = machine.memory
+    if program_len != len(machine.decoded):
+        raise ValueError(f"{path}: checkpoint of a {program_len}-instruction program, "
+                         f"loaded program has {len(machine.decoded)}")
+    if digest != machine.program_digest():
+        raise ValueError(f"{path}: checkpoint of a different program of the same length")
+    if (base, limit) != (memory.base, memory.limit):
+        raise ValueError(f"{path}: checkpoint memory is 0x{base:X}-0x{limit:X}, "
+                         f"simulator memory is 0x{memory.base:X}-0x{memory.limit:X}")
+    offset = HEADER.size
+    pages = {}
+    for _ in range(page_count):
+        number, = PAGE_NUMBER.unpack_from(body, offset)
+        offset += PAGE_NUMBER.size
+        pages[number] = isa.bytes_to_words(body[offset:offset + 4 * PAGE_WORDS])
+        offset += 4 * PAGE_WORDS
+    memory.pages = pages
+    machine.registers[:] = registers
+    machine.pc = pc
+    machine.steps = steps
+    machine.halted = False
@@ -0,0 +1,155 @@
+"""Shared encoding layer for the RV32 subset used by Assembler.py and Simulator.py.
+
+Instructions are handled as 32-bit ints; fields are read and written with
+shifts and masks. Binary strings only appear at the text-format I/O edges
+(word_to_text / text_to_word).
+
+Programs are stored either as text, one 32-char '0'/'1' line per
+instruction (the default), or packed: one little-endian 32-bit word per
+instruction with no header. Files ending in BIN_EXTENSION are packed;
+otherwise program_format() sniffs the content.
+"""
+
+import sys
+from array import array
+
+MASK32 = 0xFFFFFFFF
+WORD_BITS = 32
+
+# Opcodes
+OP_R = 0b0110011
+OP_ADDI = 0b0010011
+OP_LW = 0b0000011
+OP_JALR = 0b1100111
+OP_S = 0b0100011
+OP_B = 0b1100011
+OP_J = 0b1101111
+
+
+def sign_extend(value, bits):
+    """Interpret the low `bits` bits of value as a two's complement integer."""
+    value &= (1 << bits) - 1
+    if value >> (bits - 1):
+        return value - (1 << bits)
+    return value
+
+
+def to_unsigned(value, bits):
+    """Two's complement encoding of value in `bits` bits."""
+    return value & ((1 << bits) - 1)
+
+
+# --- Field extraction ---
+
+def opcode(word):
+    return word & 0x7F
+
+def rd(word):
+    return (word >> 7) & 0x1F
+
+def funct3(word):
+    return (word >> 12) & 0x7
+
+def rs1(word):
+    return (word >> 15) & 0x1F
+
+def rs2(word):
+    return (word >> 20) & 0x1F
+
+def funct7(word):
+    return (word >> 25) & 0x7F
+
+def imm_I(word):
+    return sign_extend(word >> 20, 12)
+
+def imm_S(word):
+    return sign_extend(((word >> 25) << 5) | ((word >> 7) & 0x1F), 12)
+
+def imm_B(word):
+    # {imm[12], imm[11], imm[10:5], imm[4:1], 0}
+    imm = (((word >> 31) & 0x1) << 12) \
+        | (((word >> 7) & 0x1) << 11) \
+        | (((word >> 25) & 0x3F) << 5) \
+        | (((word >> 8) & 0xF) << 1)
+    return sign_extend(imm, 13)
+
+def imm_J(word):
+    # {imm[20], imm[19:12], imm[11], imm[10:1], 0}
+    imm = (((word >> 31) & 0x1) << 20) \
+        | (((word >> 12) & 0xFF) << 12) \
+        | (((word >> 20) & 0x1) << 11) \
+        | (((word >> 21) & 0x3FF) << 1)
+    return sign_extend(imm, 21)
+
+
+# --- Field insertion ---
+
+def encode_R(funct7, rs2, rs1, funct3, rd, opcode):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def encode_I(imm, rs1, funct3, rd, opcode):
+    return (to_unsigned(imm, 12) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def encode_S(imm, rs2, rs1, funct3, opcode):
+    imm = to_unsigned(imm, 12)
+    return ((imm >> 5) << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | ((imm & 0x1F) << 7) | opcode
+
+def encode_B(offset, rs2, rs1, funct3, opcode):
+    imm = to_unsigned(offset, 13)
+    return (((imm >> 12) & 0x1) << 31) \
+        | (((imm >> 5) & 0x3F) << 25) \
+        | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) \
+        | (((imm >> 1) & 0xF) << 8) \
+        | (((imm >> 11) & 0x1) << 7) \
+        | opcode
+
+def encode_J(offset, rd, opcode):
+    imm = to_unsigned(offset, 21)
+    return (((imm >> 20) & 0x1) << 31) \
+        | (((imm >> 1) & 0x3FF) << 21) \
+        | (((imm >> 11) & 0x1) << 20) \
+        | (((imm >> 12) & 0xFF) << 12) \
+        | (rd << 7) \
+        | opcode
+
+
+# --- Text format edges ---
+
+def word_to_text(word):
+    """Render a word as a 32-char '0'/'1' line (without newline)."""
+    return format(word, '032b')
+
+def text_to_word(line):
+    """Parse a 32-char '0'/'1' line into an int word."""
+    return int(line, 2)
+
+
+# --- Packed format edges ---
+
+BIN_EXTENSION = '.bin'
+TEXT_BYTES = frozenset(b'01\r\n \t')
+
+def words_to_bytes(words):
+    """Pack int words as little-endian 32-bit words."""
+    packed = array('I', words)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+def bytes_to_words(data):
+    """Unpack little-endian 32-bit words (bytes, bytearray or mmap) into an array('I')."""
+    if len(data) % 4:
+        raise ValueError(f"packed program is {len(data)} bytes, not a whole number of words")
+    words = array('I')
+    words.frombytes(data)
+    if sys.byteorder != 'little':
+        words.byteswap()
+    return words
+
+def program_format(path):
+    """'bin' for a packed program, 'text' for one '0'/'1' line per word."""
+    if path.endswith(BIN_EXTENSION):
+        return 'bin'
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    return 'text' if set(head) <= TEXT_BYTES else 'bin'
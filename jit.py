@@ -0,0 +1,140 @@
+"""Basic-block translation for Simulator.py.
+
+A basic block is a run of pre-decoded instructions starting at some PC and
+ending at the first control transfer (beq/bne/blt/jal/jalr, the virtual
+halt) or at MAX_BLOCK instructions. Each block is turned into Python source,
+compiled once with compile(), and cached by its start index. The generated
+function updates the register file and memory in one call, passes the state
+after every instruction to the trace sink exactly as simulate() would, and
+returns the next PC.
+"""
+
+MAX_BLOCK = 256
+
+# Handlers that end a block. Any handler without a template below is also
+# treated as a terminator and called directly from the generated code.
+TERMINATORS = {'op_beq', 'op_bne', 'op_blt', 'op_jal', 'op_jalr', 'op_halt'}
+
+
+
+def _reg(r):
+    # x0 always reads as zero, so it is folded into a constant.
+    return f'R[{r}]' if r else '0'
+
+
+def _write(rd, expr):
+    # Writes to x0 are discarded, so they are dropped from the block.
+    return [f'R[{rd}] = {expr}'] if rd else []
+
+
+def _straight(name, d):
+    """Source lines for an instruction that always falls through to pc + 4."""
+    if name == 'op_add':
+        return _write(d.rd, f'({_reg(d.rs1)} + {_reg(d.rs2)}) & 0xFFFFFFFF')
+    if name == 'op_sub':
+        return _write(d.rd, f'({_reg(d.rs1)} - {_reg(d.rs2)}) & 0xFFFFFFFF')
+    if name == 'op_slt':
+        return _write(d.rd, f'1 if {_reg(d.rs1)} < {_reg(d.rs2)} else 0')
+    if name == 'op_srl':
+        return _write(d.rd, f'({_reg(d.rs1)} & 0xFFFFFFFF) >> ({_reg(d.rs2)} & 0x1F)')
+    if name == 'op_or':
+        return _write(d.rd, f'{_reg(d.rs1)} | {_reg(d.rs2)}')
+    if name == 'op_and':
+        return _write(d.rd, f'{_reg(d.rs1)} & {_reg(d.rs2)}')
+    if name == 'op_addi':
+        return _write(d.rd, f'({_reg(d.rs1)} + {d.imm}) & 0xFFFFFFFF')
+    if name == 'op_lw':
+        if not d.rd:
+            return []
+        return [f'R[{d.rd}] = M.load({_reg(d.rs1)} + {d.imm})']
+    if name == 'op_sw':
+        return [f'M.store({_reg(d.rs1)} + {d.imm}, {_reg(d.rs2)})']
+    if name == 'op_nop':
+        return []
+    return None
+
+
+def _terminator(name, d, pc, k):
+    """Source lines that set `pc` for a block-ending instruction."""
+    if name in ('op_beq', 'op_bne', 'op_blt'):
+        cmp = {'op_beq': '==', 'op_bne': '!=', 'op_blt': '<'}[name]
+        return [f'pc = {pc + d.imm} if {_reg(d.rs1)} {cmp} {_reg(d.rs2)} else {pc + 4}']
+    if name == 'op_jal':
+        return _write(d.rd, (pc + 4) & 0xFFFFFFFF) + [f'pc = {pc + d.imm}']
+    if name == 'op_jalr':
+        return [f'pc = ({_reg(d.rs1)} + {d.imm}) & 0xFFFFFFFE'] + _write(d.rd, pc + 4)
+    if name == 'op_halt':
+        return [f'pc = {pc + 4}']
+    # Unknown handler: call it the way the interpreter loop would.
+    return [f'pc = H{k}(R, M, {pc}, D{k})', 'R[0] = 0']
+
+
+class Block:
+    """A compiled basic block covering instruction indices [start, end)."""
+    __slots__ = ('start', 'end', 'run', 'halts', 'source')
+
+    def __init__(self, start, end, run, halts, source):
+        self.start = start
+        self.end = end
+        self.run = run
+        self.halts = halts
+        self.source = source
+
+
+def compile_block(decoded, handlers, start):
+    """Translate the block starting at instruction index `start`."""
+    namespace = {}
+    body = []
+    index = start
+    halts = False
+    while index < len(decoded) and index - start < MAX_BLOCK:
+        d = decoded[index]
+        name = handlers[index].__name__
+        pc = index * 4
+        body.append(f'# {pc}: {name}')
+        lines = None if name in TERMINATORS else _straight(name, d)
+        if lines is not None:
+            body.extend(lines)
+            body.append(f'step({pc + 4}, R, {d.rd})')
+            index += 1
+            continue
+        k = index - start
+        namespace[f'H{k}'] = handlers[index]
+        namespace[f'D{k}'] = d
+        body.extend(_terminator(name, d, pc, k))
+        body.append(f'step(pc, R, {d.rd})')
+        body.append('return pc')
+        halts = name == 'op_halt'
+        index += 1
+        break
+    else:
+        # Fell off the end of the block (or the program): continue sequentially.
+        body.append(f'return {index * 4}')
+    source = 'def block(R, M, step):\n' + ''.join(f'    {line}\n' for line in body)
+    exec(compile(source, f'<block {start * 4}>', 'exec'), namespace)
+    return Block(start, index, namespace['block'], halts, source)
+
+
+class BlockCache:
+    """Compiled blocks of one program, keyed by start instruction index."""
+
+    def __init__(self, decoded, handlers):
+        self.decoded = decoded
+        self.handlers = handlers
+        self.blocks = {}
+
+    def get(self, index):
+        block = self.blocks.get(index)
+        if block is None:
+            block = self.blocks[index] = compile_block(self.decoded, self.handlers, index)
+        return block
+
+    def invalidate(self, index=None):
+        """Drop every block that covers instruction `index` (all blocks if None).
+
+        Call this whenever the decoded program or its handlers change."""
+        if index is None:
+            self.blocks.clear()
+            return
+        for start in [s for s, b in self.blocks.items() if b.start <= index < b.end]:
+            del self.blocks[start]
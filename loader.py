@@ -0,0 +1,123 @@
+"""Lazy, memory-mapped instruction images for Simulator.py.
+
+LazyProgram maps the machine code file instead of reading it, and decodes
+an instruction only when the PC first reaches it. Both program formats have
+a fixed stride (4 bytes per packed word, one 32-char line plus newline per
+text word), so instruction i is found by offset arithmetic and opening even a
+huge image is O(1).
+
+Decoded instructions and their handlers live in a direct-mapped cache of
+CACHE_SIZE slots (slot = index & (CACHE_SIZE - 1)); an instruction evicted
+by another one that maps to the same slot is simply decoded again, so memory
+use does not depend on program size.
+"""
+
+import mmap
+import os
+import struct
+
+import isa
+
+CACHE_SIZE = 1 << 16
+
+WORD = struct.Struct('<I')
+
+
+class LazyProgram:
+    """The instruction image of one file, decoded on demand.
+
+    `predecode` turns a word into a decoded record and `resolve` picks its
+    handler (Simulator.predecode / Simulator.resolve). Raises ValueError for
+    a text file whose lines are not all 32 characters; load such files
+    eagerly instead."""
+
+    def __init__(self, path, predecode, resolve, cache_size=CACHE_SIZE):
+        if cache_size & (cache_size - 1):
+            raise ValueError("cache_size must be a power of two")
+        self.predecode = predecode
+        self.resolve = resolve
+        size = os.path.getsize(path)
+        self.packed = isa.program_format(path) == 'bin'
+        self.map = None
+        if size:
+            with open(path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.packed:
+            if size % 4:
+                raise ValueError(f"{path}: packed program is {size} bytes, not a whole number of words")
+            self.stride = 4
+            self.length = size // 4
+        else:
+            self.stride, self.length = self._text_layout(path, size)
+        self.mask = cache_size - 1
+        self.tags = [-1] * cache_size
+        self.decoded_slots = [None] * cache_size
+        self.handler_slots = [None] * cache_size
+        self.decoded = _SlotView(self, self.decoded_slots)
+        self.handlers = _SlotView(self, self.handler_slots)
+
+    def _text_layout(self, path, size):
+        if not size:
+            return 33, 0
+        newline = self.map.find(b'\n', 0, 64)
+        if newline < 0 and (size == 32 or (size == 33 and self.map[32:33] == b'\r')):
+            # A single word without a final newline, as Assembler.py writes it.
+            return size, 1
+        stride = newline + 1
+        if newline not in (32, 33) or (newline == 33 and self.map[32:33] != b'\r'):
+            raise ValueError(f"{path}: first line is not a 32-bit word")
+        # The last line may or may not end with a newline.
+        length, rest = divmod(size, stride)
+        if rest == 32:
+            length += 1
+        elif rest:
+            raise ValueError(f"{path}: lines are not all 32-bit words")
+        return stride, length
+
+    def word(self, index):
+        """The instruction word at `index`, read straight from the mapping."""
+        if self.packed:
+            return WORD.unpack_from(self.map, 4 * index)[0]
+        offset = self.stride * index
+        text = self.map[offset:offset + 32]
+        if len(text) != 32 or text.strip(b'01'):
+            raise ValueError(f"line {index + 1} is not a 32-bit word")
+        return int(text, 2)
+
+    def fill(self, index):
+        """Decode instruction `index` into its cache slot and return the slot."""
+        slot = index & self.mask
+        d = self.predecode(self.word(index))
+        self.decoded_slots[slot] = d
+        self.handler_slots[slot] = self.resolve(d)
+        self.tags[slot] = index
+        return slot
+
+    def __len__(self):
+        return self.length
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class _SlotView:
+    """Read-only sequence over one of the decode cache's slot lists, so code
+    that indexes whole programs (the JIT) works unchanged."""
+
+    def __init__(self, program, slots):
+        self.program = program
+        self.slots = slots
+
+    def __len__(self):
+        return self.program.length
+
+    def __getitem__(self, index):
+        program = self.program
+        if not 0 <= index < program.length:
+            raise IndexError(index)
+        slot = index & program.mask
+        if program.tags[slot] != index:
+            program.fill(index)
+        return self.slots[slot]
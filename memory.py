@@ -0,0 +1,65 @@
+"""Sparse data memory for Simulator.py.
+
+Addresses are byte addresses. Words live in 4 KiB pages (array('I') of
+PAGE_WORDS entries) held in a dict keyed by page number. A page is allocated
+the first time a word in it is stored, so lw/sw stay O(1) and memory use is
+proportional to the pages actually written, however large the address space.
+
+Word accesses use the word containing the address (addr // 4), and accesses
+outside [base, base + size) read as 0 and drop stores, as the original
+32-word simulator memory did.
+"""
+
+from array import array
+
+PAGE_SHIFT = 12                     # 4 KiB pages
+PAGE_WORDS = 1 << (PAGE_SHIFT - 2)
+WORD_MASK = PAGE_WORDS - 1
+
+# The original simulator memory: 32 words at addresses 0x00-0x7F, dumped
+# with addresses labelled from 0x00010000.
+LEGACY_SIZE = 32 * 4
+LEGACY_DUMP_LABEL = 0x00010000
+DUMP_WORDS = 32
+
+
+class Memory:
+    """Lazily paged memory covering addresses [base, base + size).
+
+    dump() returns the `dump_words` words starting at `dump_base`; the trace
+    labels them starting at `dump_label` (dump_base itself by default).
+    """
+
+    def __init__(self, base=0, size=LEGACY_SIZE, dump_base=None, dump_words=None, dump_label=None):
+        self.base = base
+        self.limit = base + size
+        self.pages = {}
+        self.dump_base = base if dump_base is None else dump_base
+        self.dump_words = DUMP_WORDS if dump_words is None else dump_words
+        self.dump_label = self.dump_base if dump_label is None else dump_label
+
+    @classmethod
+    def legacy(cls):
+        return cls(dump_label=LEGACY_DUMP_LABEL)
+
+    def load(self, addr):
+        if self.base <= addr < self.limit:
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            if page is not None:
+                return page[(addr >> 2) & WORD_MASK]
+        return 0
+
+    def store(self, addr, value):
+        if self.base <= addr < self.limit:
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            if page is None:
+                page = self.pages[addr >> PAGE_SHIFT] = array('I', bytes(4 * PAGE_WORDS))
+            page[(addr >> 2) & WORD_MASK] = value
+
+    def dump(self):
+        """The words of the configured dump region, in address order."""
+        start = self.dump_base
+        return [self.load(start + 4 * i) for i in range(self.dump_words)]
+
+    def __repr__(self):
+        return f"Memory(base=0x{self.base:08X}, limit=0x{self.limit:08X}, pages={len(self.pages)})"
@@ -0,0 +1,127 @@
+"""Instruction-level profiling for Simulator.py.
+
+simulate(..., profile=path) runs the program with Machine.run_profiled(),
+a copy of the interpreter loop that also counts, per instruction, how often
+it executed and how often it transferred control (a taken branch or a
+jump). Everything else in the report (opcode classes, branch statistics,
+basic blocks) is derived from those two counters after the run, and runs
+without profile use the plain loop, so profiling costs nothing when off.
+
+If the program was assembled with `Assembler.py --source-map`, the report
+shows the source line and label of each hot spot.
+"""
+
+import json
+
+from isa import OP_R, OP_ADDI, OP_LW, OP_JALR, OP_S, OP_B, OP_J
+
+# Opcode class of each opcode; anything else is reported as '?'.
+CLASSES = {OP_R: 'R', OP_ADDI: 'I', OP_LW: 'I', OP_JALR: 'I', OP_S: 'S', OP_B: 'B', OP_J: 'J'}
+CONTROL = (OP_B, OP_J, OP_JALR)
+
+TOP = 10
+
+
+class Profile:
+    """Per-instruction execution and control-transfer counters."""
+    __slots__ = ('counts', 'taken')
+
+    def __init__(self, program_len):
+        self.counts = [0] * program_len     # executions of the instruction at PC 4 * i
+        self.taken = [0] * program_len      # executions that did not fall through to PC + 4
+
+
+def load_source_map(path):
+    """The [line, text, labels] entries written by Assembler.write_source_map()."""
+    with open(path, 'r') as f:
+        return json.load(f)['words']
+
+
+def basic_blocks(profile, decoded):
+    """(start, end) instruction index ranges of the executed basic blocks."""
+    counts = profile.counts
+    executed = [i for i, count in enumerate(counts) if count]
+    leaders = set()
+    for i in executed:
+        d = decoded[i]
+        if d.opcode in CONTROL:
+            leaders.add(i + 1)
+            if d.opcode != OP_JALR:
+                leaders.add(i + d.imm // 4)
+    blocks = []
+    start = prev = None
+    for i in executed:
+        if start is None or i in leaders or i != prev + 1:
+            if start is not None:
+                blocks.append((start, prev + 1))
+            start = i
+        prev = i
+    if start is not None:
+        blocks.append((start, prev + 1))
+    return blocks
+
+
+def _where(index, source_map):
+    """'line N: text' for the instruction at index, if the map covers it."""
+    if source_map is None or index >= len(source_map):
+        return ''
+    line, text, _ = source_map[index]
+    return f'line {line}: {text}'
+
+
+def _label(index, source_map):
+    """The label at index, or the nearest label above it plus a byte offset."""
+    if source_map is None:
+        return ''
+    for i in range(min(index, len(source_map) - 1), -1, -1):
+        labels = source_map[i][2]
+        if labels:
+            return labels[-1] if i == index else f'{labels[-1]}+{4 * (index - i)}'
+    return ''
+
+
+def report(profile, decoded, source_map=None, top=TOP):
+    """The profile as a text report."""
+    counts = profile.counts
+    taken = profile.taken
+    total = sum(counts)
+    out = [f'steps executed: {total}', '']
+
+    by_class = {}
+    for i, count in enumerate(counts):
+        if count:
+            cls = CLASSES.get(decoded[i].opcode, '?')
+            by_class[cls] = by_class.get(cls, 0) + count
+    out.append('by opcode class:')
+    for cls in ('R', 'I', 'S', 'B', 'J', '?'):
+        if cls in by_class:
+            out.append(f'  {cls}  {by_class[cls]:>12}  {100 * by_class[cls] / total:6.2f}%')
+    out.append('')
+
+    blocks = basic_blocks(profile, decoded)
+    blocks.sort(key=lambda b: sum(counts[b[0]:b[1]]), reverse=True)
+    out.append(f'hottest basic blocks (top {top}):')
+    out.append(f'  {"pc range":<21}{"entries":>10}{"steps":>12}{"share":>8}  label / source')
+    for start, end in blocks[:top]:
+        steps = sum(counts[start:end])
+        where = _label(start, source_map)
+        if source_map is not None and end - 1 < len(source_map):
+            where += f' (lines {source_map[start][0]}-{source_map[end - 1][0]})'
+        out.append(f'  {start * 4:>8}-{(end - 1) * 4:<12}{counts[start]:>10}{steps:>12}'
+                   f'{100 * steps / total:7.2f}%  {where.strip()}')
+    out.append('')
+
+    hot = sorted((i for i, count in enumerate(counts) if count), key=lambda i: counts[i], reverse=True)
+    out.append(f'hottest instructions (top {top}):')
+    out.append(f'  {"pc":>8}{"count":>12}  cls  label / source')
+    for i in hot[:top]:
+        cls = CLASSES.get(decoded[i].opcode, '?')
+        out.append(f'  {i * 4:>8}{counts[i]:>12}  {cls:<3}  {_label(i, source_map):<12} {_where(i, source_map)}'.rstrip())
+    out.append('')
+
+    branches = [i for i in hot if decoded[i].opcode == OP_B]
+    out.append(f'branches (top {top}):')
+    out.append(f'  {"pc":>8}{"executed":>12}{"taken":>12}{"not taken":>12}  source')
+    for i in branches[:top]:
+        out.append(f'  {i * 4:>8}{counts[i]:>12}{taken[i]:>12}{counts[i] - taken[i]:>12}  {_where(i, source_map)}'.rstrip())
+    return '\n'.join(out) + '\n'
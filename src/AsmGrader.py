@@ -19,8 +19,8 @@ class AsmGrader(Grader):
 	BIN_HARD_DIR = "bin_h"
 	BIN_SIMPLE_DIR = "bin_s"
 
-	def __init__(self, verb, enable,operating_system):
-		super().__init__(verb, enable,operating_system)
+	def __init__(self, verb, enable,operating_system, jobs = 1, inProcess = False, maxMismatches = 1, timeout = 30, maxMemory = None, cache = None):
+		super().__init__(verb, enable,operating_system, jobs, inProcess, maxMismatches, timeout, maxMemory, cache)
 		self.enable = enable
 		self.operating_system == operating_system
 
@@ -72,54 +72,41 @@ class AsmGrader(Grader):
 		passCount = 0
 		totalCount = 0
 		
-		curDir = os.getcwd()
-		if self.operating_system == 'linux':
-			tests = self.listFiles("tests/assembly/" + genDir)
-		elif self.operating_system == 'windows':
-			tests = self.listFiles("tests\\assembly\\" + genDir)
+		# Absolute paths, so tests can run concurrently without os.chdir
+		runDir = os.path.abspath(self.ASM_RUN_DIR)
+		testDir = os.path.abspath(os.path.join("tests", "assembly", genDir))
+		userDir = os.path.abspath(os.path.join("tests", "assembly", "user_" + expDir))
+		expectedDir = os.path.abspath(os.path.join("tests", "assembly", expDir))
+		tests = self.listFiles(testDir)
 		tests.sort()
-		os.chdir(self.ASM_RUN_DIR)
-		
-		for test in tests:
-
-			python_command = 'python3 Assembler.py'
-			if self.operating_system == 'linux':
-				assembly_file = ' ' + '../automatedTesting/tests/assembly/' + genDir + '/' + test
-				machine_code_file = ' ' + '../automatedTesting/tests/assembly/user_' + expDir + '/' + test
-				machine_code_readable_file = ' ' + '../automatedTesting/tests/assembly/user_' + expDir + '/' + test.split(".")[0]+"_r.txt"
-				os.remove(machine_code_file) if os.path.exists(machine_code_file) else None; 
-				os.remove(machine_code_readable_file) if os.path.exists(machine_code_readable_file) else None;
-				#os.system('touch' + ' ' + machine_code_file)
-			elif self.operating_system == 'windows':
-				assembly_file = ' ' + '..\\automatedTesting\\tests\\assembly\\' + genDir + '\\' + test
-				machine_code_file = ' ' + '..\\automatedTesting\\tests\\assembly\\user_' + expDir + '\\' + test
-				machine_code_readable_file = ' ' + '..\\automatedTesting\\tests\\assembly\\user_' + expDir + '\\' + test.split(".")[0]+"_r.txt"
-				os.remove(machine_code_file) if os.path.exists(machine_code_file) else None; 
-				os.remove(machine_code_readable_file) if os.path.exists(machine_code_readable_file) else None;
-				#os.system('cd . >' + machine_code_file)
-			command = python_command + assembly_file + machine_code_file + machine_code_readable_file
-			os.system(command)
-			generatedBin = open(machine_code_file.strip(),'r').readlines()
+		os.makedirs(userDir, exist_ok=True)
 
-			if self.operating_system == 'linux':
-				exact_machine_code_file = "../automatedTesting/tests/assembly/" + expDir + "/" + test
-			elif self.operating_system == 'windows':
-				exact_machine_code_file = "..\\automatedTesting\\tests\\assembly\\" + expDir + "\\" + test
-			try:
-				expectedBin = open(exact_machine_code_file,'r').readlines()
-			except FileNotFoundError:
+		testArgs = []
+		for test in tests:
+			assembly_file = os.path.join(testDir, test)
+			machine_code_file = os.path.join(userDir, test)
+			machine_code_readable_file = os.path.join(userDir, test.split(".")[0] + "_r.txt")
+			os.remove(machine_code_file) if os.path.exists(machine_code_file) else None; 
+			os.remove(machine_code_readable_file) if os.path.exists(machine_code_readable_file) else None;
+			testArgs.append([assembly_file, machine_code_file, machine_code_readable_file])
+
+		expectedFiles = [os.path.join(expectedDir, test) for test in tests]
+		results = self.runTestsCached('Assembler.py', 'assembler', testArgs, expectedFiles, runDir)
+		for test, args, exact_machine_code_file, result in zip(tests, testArgs, expectedFiles, results):
+			self.printSev(self.HIGH, result.stdout, end="")
+			if self.limitExceeded(result, test):
+				totalCount += 1
+				continue
+			if not os.path.exists(exact_machine_code_file):
 				self.printSev(self.HIGH, bcolors.WARNING + "[Golden Binary Opcode File Not Found]\n" + exact_machine_code_file)
-				expectedBin = " "
-			
 
-			if self.diff(generatedBin, expectedBin):
+			if self.checkResult(result, args[1], exact_machine_code_file):
 				self.printSev(self.HIGH, bcolors.OKGREEN + "[PASSED]" + bcolors.ENDC + " " + test)
 				passCount += 1
 			else:
 				self.printSev(self.HIGH, bcolors.FAIL + "[FAILED]" + bcolors.ENDC + " " + test)
 			totalCount += 1
 
-		os.chdir(curDir)
 		return passCount, totalCount
 	
 	
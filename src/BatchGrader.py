@@ -0,0 +1,132 @@
+# Batch Grader class: grades every submission in a directory and writes the
+# results as one CSV or JSON matrix instead of printing them
+#
+# Each subdirectory of the submissions directory is one submission, laid out
+# like the directory above automatedTesting (SimpleAssembler/Assembler.py,
+# SimpleSimulator/Simulator.py). Every (submission, test) pair is a separate
+# job; all jobs go into one queue and the worker threads take the next one as
+# soon as they are free, so a slow submission never holds up the others.
+# Workers only wait on the python3 processes running the tests.
+
+import csv
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from Grader import Grader
+from AsmGrader import AsmGrader
+from SimGrader import SimGrader
+
+# component: "assembler" or "simulator"; runDir: directory of script inside
+# a submission; testDir/expectedDir: relative to automatedTesting
+Suite = namedtuple('Suite', 'component name runDir script entryPoint testDir expectedDir marks')
+
+class BatchGrader(Grader):
+
+	SUITES = [
+		Suite("assembler", "Simple", "SimpleAssembler", "Assembler.py", "assembler",
+			os.path.join("tests", "assembly", AsmGrader.ASM_SIMPLE_DIR),
+			os.path.join("tests", "assembly", AsmGrader.BIN_SIMPLE_DIR), AsmGrader.SIMPLE_MARKS),
+		Suite("assembler", "Hard", "SimpleAssembler", "Assembler.py", "assembler",
+			os.path.join("tests", "assembly", AsmGrader.ASM_HARD_DIR),
+			os.path.join("tests", "assembly", AsmGrader.BIN_HARD_DIR), AsmGrader.HARD_MARKS),
+		Suite("simulator", "Simple", "SimpleSimulator", "Simulator.py", "simulate",
+			os.path.join("tests", "bin", SimGrader.BIN_SIMPLE_DIR),
+			os.path.join("tests", "traces", SimGrader.TRACE_SIMPLE_DIR), SimGrader.SIMPLE_MARKS),
+		Suite("simulator", "Hard", "SimpleSimulator", "Simulator.py", "simulate",
+			os.path.join("tests", "bin", SimGrader.BIN_HARD_DIR),
+			os.path.join("tests", "traces", SimGrader.TRACE_HARD_DIR), SimGrader.HARD_MARKS),
+	]
+
+	# Status of a test whose submission has no script for it
+	MISSING = "MISSING"
+
+	def __init__(self, submissionsDir, outputDir, components, operating_system, jobs = 1, timeout = 30, maxMemory = None, cache = None):
+		super().__init__(False, True, operating_system, jobs, False, 1, timeout, maxMemory, cache)
+		self.submissionsDir = os.path.abspath(submissionsDir)
+		# Generated files go to outputDir/<submission>/<component>/<suite>/
+		self.outputDir = os.path.abspath(outputDir)
+		self.suites = [suite for suite in self.SUITES if suite.component in components]
+
+	def listSubmissions(self):
+		if not os.path.isdir(self.submissionsDir):
+			return []
+		return sorted(d for d in os.listdir(self.submissionsDir) if os.path.isdir(os.path.join(self.submissionsDir, d)))
+
+	def column(self, suite, test):
+		return suite.component + "/" + suite.name.lower() + "/" + test
+
+	def runJob(self, job):
+		# Runs one test of one submission and returns its status: PASSED,
+		# FAILED, MISSING, TIMEOUT or LIMIT
+		submission, suite, test = job
+		runDir = os.path.join(self.submissionsDir, submission, suite.runDir)
+		if not os.path.isfile(os.path.join(runDir, suite.script)):
+			return self.MISSING
+		userDir = os.path.join(self.outputDir, submission, suite.component, suite.name.lower())
+		os.makedirs(userDir, exist_ok=True)
+		outputFile = os.path.join(userDir, test)
+		readableFile = os.path.join(userDir, test.split(".")[0] + "_r.txt")
+		for path in (outputFile, readableFile):
+			if os.path.exists(path):
+				os.remove(path)
+		args = [os.path.abspath(os.path.join(suite.testDir, test)), outputFile, readableFile]
+		expectedFile = os.path.abspath(os.path.join(suite.expectedDir, test))
+
+		result = None
+		key = None
+		if self.cache is not None:
+			key = self.cache.key(self.cache.hashSubmission(runDir, suite.script), args[0], expectedFile)
+			result = self.cache.get(key, args, outputFile)
+		if result is None:
+			result = self.runCommand(['python3', suite.script] + args, runDir)
+			result.cacheKey = key
+		status = getattr(result, "status", None)
+		if status is not None:
+			return status
+		return "PASSED" if self.checkResult(result, outputFile, expectedFile) else "FAILED"
+
+	def grade(self):
+		# Grades every submission on every test. Returns the list of test
+		# columns and {submission: {column: status}}.
+		submissions = self.listSubmissions()
+		tests = [(suite, test) for suite in self.suites for test in sorted(self.listFiles(suite.testDir))]
+		jobs = [(submission, suite, test) for submission in submissions for suite, test in tests]
+		with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			statuses = list(pool.map(self.runJob, jobs))
+
+		columns = [self.column(suite, test) for suite, test in tests]
+		matrix = {submission: {} for submission in submissions}
+		for (submission, suite, test), status in zip(jobs, statuses):
+			matrix[submission][self.column(suite, test)] = status
+		return columns, matrix
+
+	def marks(self, results):
+		# Marks of one submission per component, as in Results.declareARes
+		marks = {}
+		for suite in self.suites:
+			prefix = suite.component + "/" + suite.name.lower() + "/"
+			passed = sum(1 for column, status in results.items() if column.startswith(prefix) and status == "PASSED")
+			marks[suite.component] = round(marks.get(suite.component, 0) + passed * suite.marks, 4)
+		marks["total"] = round(sum(marks.values()), 4)
+		return marks
+
+	def writeResults(self, path, columns, matrix):
+		# JSON if path ends in .json, CSV otherwise
+		if path.lower().endswith(".json"):
+			data = {"tests": columns, "submissions": {}}
+			for submission, results in matrix.items():
+				data["submissions"][submission] = {"marks": self.marks(results), "results": results}
+			with open(path, 'w') as f:
+				json.dump(data, f, indent=1)
+			return
+
+		components = [c for c in ("assembler", "simulator") if any(s.component == c for s in self.suites)]
+		with open(path, 'w', newline="") as f:
+			writer = csv.writer(f)
+			writer.writerow(["submission"] + components + ["total"] + columns)
+			for submission, results in matrix.items():
+				marks = self.marks(results)
+				writer.writerow([submission] + [marks[c] for c in components] + [marks["total"]]
+					+ [results[column] for column in columns])
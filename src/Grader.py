@@ -1,13 +1,38 @@
 # Parent class for all graders
 from os import listdir
-from os.path import isfile, join
+from os.path import isfile, isdir, join
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+try:
+	import resource
+except ImportError:	# not available on Windows
+	resource = None
 from colors import bcolors
+from InProcessRunner import TestTimeout, loadRunner
 
 class Grader:
 	## ---- either 'linux' or 'windows'
 	operating_system = 'linux'
 	verbose = False
 	enable = False
+	# Number of tests run concurrently
+	jobs = 1
+	# Call submissions inside this process instead of starting python3 per test
+	inProcess = False
+	# Mismatching lines reported before a comparison gives up
+	maxMismatches = 1
+	# Characters read from an output file at a time
+	READ_CHUNK = 1 << 16
+	# Longest cleaned line compared; a longer one is reported as a mismatch
+	MAX_LINE = 1 << 20
+	# Per-test limits: wall-clock seconds and memory in MiB (None for no limit)
+	timeout = 30
+	maxMemory = None
+	# Cache of earlier results (a ResultCache), or None to run every test
+	cache = None
+	# Result status of a test that was stopped for exceeding a limit
+	TIMEOUT = "TIMEOUT"
+	LIMIT = "LIMIT"
 	
 	# Printing severity
 	HIGH = 1 	# Printed even if not verbose
@@ -18,40 +43,277 @@ class Grader:
 			print(string, end=end)
 
 	def listFiles(self, dirPath):
+		if not isdir(dirPath):
+			self.printSev(self.HIGH, bcolors.WARNING + "[Test Directory Not Found] " + dirPath + bcolors.ENDC)
+			return []
 		return [f for f in listdir(dirPath) if isfile(join(dirPath, f))]
 
 
-	def diff(self, lines1, lines2):
-		lines1Clean = []
-		lines2Clean = []
+	def limitResult(self, command, status, output = ""):
+		# Result of a test stopped for exceeding a limit; status is TIMEOUT or LIMIT
+		result = subprocess.CompletedProcess(command, None, output)
+		result.status = status
+		return result
 
-		for l in lines1:
-			if l.strip() != "":
-				lines1Clean.append(l.strip())
+	# Runs `python3 -c MEMORY_LIMIT LIMIT SCRIPT ARGS...`: caps the address
+	# space of the test process at LIMIT bytes, then runs SCRIPT as __main__.
+	# Linux does not enforce a resident set limit, so capping the address
+	# space is what bounds it. Done in the child itself, as preexec_fn is not
+	# safe while other threads (--jobs, --batch) are running.
+	MEMORY_LIMIT = "; ".join([
+		"import os, resource, runpy, sys",
+		"limit = int(sys.argv[1])",
+		"resource.setrlimit(resource.RLIMIT_AS, (limit, limit))",
+		"sys.argv = sys.argv[2:]",
+		"sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))",
+		"runpy.run_path(sys.argv[0], run_name='__main__')",
+	])
 
-		for l in lines2:
-			if l.strip() != "":
-				lines2Clean.append(l.strip())
+	def runCommand(self, command, cwd):
+		# Output is captured so that concurrent tests do not interleave, and
+		# decoded leniently, since a submission may print any bytes.
+		# A test that runs out of time is killed by subprocess.run
+		limited = self.maxMemory is not None and resource is not None
+		run = command
+		if limited:
+			run = [command[0], "-c", self.MEMORY_LIMIT, str(self.maxMemory << 20)] + command[1:]
+		try:
+			result = subprocess.run(run, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+				timeout=self.timeout)
+		except subprocess.TimeoutExpired as e:
+			output = e.output.decode(errors="replace") if isinstance(e.output, bytes) else (e.output or "")
+			return self.limitResult(command, self.TIMEOUT, output)
+		if limited and (result.returncode < 0 or "MemoryError" in result.stdout):
+			return self.limitResult(command, self.LIMIT, result.stdout)
+		result.args = command
+		return result
 
-		match = True
+	def runCommands(self, commands, cwd):
+		# Runs every command with working directory cwd, up to self.jobs at a time.
+		# Results are yielded in the order of commands, as soon as each is available.
+		if self.jobs <= 1:
+			for command in commands:
+				yield self.runCommand(command, cwd)
+			return
+		with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			yield from pool.map(lambda command: self.runCommand(command, cwd), commands)
 
-		# Match Size
-		if(len(lines1Clean) > len(lines2Clean)):
-			lines2Clean += [""] * (len(lines1Clean) - len(lines2Clean))
-		elif(len(lines2Clean) > len(lines1Clean)):
-			lines1Clean += [""] * (len(lines2Clean) - len(lines1Clean))
+	def getInProcessRunner(self, cwd, script, entryPoint):
+		# Imports the submission once per grader; None if it cannot be imported
+		key = (cwd, script)
+		if key not in self.runners:
+			self.runners[key] = loadRunner(cwd, script, entryPoint, lambda e: self.printSev(self.HIGH,
+				bcolors.WARNING + "[In-process import failed, using subprocesses] " + str(e) + bcolors.ENDC))
+		return self.runners[key]
 
-		for lineNum, lines in enumerate(zip(lines1Clean, lines2Clean), 1):
-			if(lines[0] != lines[1]):
-				self.printSev(self.LOW, bcolors.FAIL + "Mismatch at line " + str(lineNum) +  "." + bcolors.ENDC)
-				match &= False
+	def runTests(self, script, entryPoint, testArgs, cwd):
+		# Runs script once per argument list in testArgs, with working directory cwd.
+		# In-process mode calls entryPoint(input, output) of the imported script
+		# instead, one test at a time, and falls back to subprocesses if the
+		# import fails. Tests over a limit come back with status TIMEOUT or LIMIT.
+		# A memory limit needs a process of its own, so it disables in-process mode.
+		runner = None
+		if self.inProcess and self.maxMemory is None:
+			runner = self.getInProcessRunner(cwd, script, entryPoint)
+		if runner is not None:
+			for args in testArgs:
+				try:
+					result = runner.run(args, self.timeout)
+				except TestTimeout:
+					result = self.limitResult(args, self.TIMEOUT)
+				yield result
+			return
+		yield from self.runCommands([['python3', script] + args for args in testArgs], cwd)
 
-		return match
+	def runTestsCached(self, script, entryPoint, testArgs, expectedFiles, cwd):
+		# Like runTests, but tests whose submission, input and golden output
+		# (expectedFiles) are unchanged since they were last graded are not run:
+		# their output file is restored from the cache and the result comes back
+		# with .passed set. Fresh results carry .cacheKey for storeResult.
+		if self.cache is None:
+			yield from self.runTests(script, entryPoint, testArgs, cwd)
+			return
+		submission = self.cache.hashSubmission(cwd, script)
+		keys = [self.cache.key(submission, args[0], expected) for args, expected in zip(testArgs, expectedFiles)]
+		hits = [self.cache.get(key, args, args[1]) for key, args in zip(keys, testArgs)]
+		fresh = self.runTests(script, entryPoint, [args for args, hit in zip(testArgs, hits) if hit is None], cwd)
+		for key, hit in zip(keys, hits):
+			if hit is None:
+				hit = next(fresh)
+				hit.cacheKey = key
+			yield hit
 
-	def __init__(self, verb, enable,operating_system):
+	def checkResult(self, result, outputFile, expectedFile):
+		# Whether the test's outputFile matches expectedFile, from the cache if
+		# the test was not run again. Results of runs that were stopped by a
+		# limit depend on the limits and are not cached.
+		passed = getattr(result, "passed", None)
+		if passed is not None:
+			self.printSev(self.LOW, "Result of an earlier run of this submission on this test (cached).")
+		else:
+			passed = self.diffFiles(outputFile, expectedFile)
+			key = getattr(result, "cacheKey", None)
+			if key is not None and getattr(result, "status", None) is None:
+				self.cache.put(key, result, outputFile, passed)
+		return passed
+
+	def limitExceeded(self, result, test):
+		# Reports a test stopped for exceeding a limit; False for any other result
+		status = getattr(result, "status", None)
+		if status is None:
+			return False
+		self.printSev(self.HIGH, bcolors.FAIL + "[" + status + "]" + bcolors.ENDC + " " + test)
+		return True
+
+	def readChunks(self, path):
+		# The cleaned text of a file (every line stripped, blank lines dropped,
+		# each line ended by "\n") in pieces, read READ_CHUNK characters at a
+		# time; a missing file has none. The only text carried from one chunk
+		# to the next is whitespace that may still turn out to be trailing,
+		# and at most MAX_LINE + 1 characters of it, so no line is ever held whole.
+		try:
+			f = open(path, 'r')
+		except FileNotFoundError:
+			return
+		with f:
+			started = False		# the current line has text
+			pending = ""		# whitespace after the current line's text so far
+			for chunk in iter(lambda: f.read(self.READ_CHUNK), ""):
+				out = []
+				for i, segment in enumerate(chunk.split("\n")):
+					if i > 0:
+						if started:
+							out.append("\n")
+						started = False
+						pending = ""
+					if not started:
+						segment = segment.lstrip()
+						if segment == "":
+							continue
+						started = True
+					text = segment.rstrip()
+					if text != "":
+						out.append(pending)
+						out.append(text)
+						pending = segment[len(text):]
+					else:
+						pending += segment
+					pending = pending[:self.MAX_LINE + 1]
+				if out:
+					yield "".join(out)
+			if started:
+				yield "\n"
+
+	def firstDifference(self, line1, line2):
+		for column, (c1, c2) in enumerate(zip(line1, line2), 1):
+			if c1 != c2:
+				return column
+		return min(len(line1), len(line2)) + 1
+
+	def diff(self, chunks1, chunks2):
+		# chunks1 and chunks2 are cleaned text in pieces (see readChunks),
+		# compared line by line as it arrives; a file with fewer lines is
+		# padded with empty ones. Lines longer than MAX_LINE count as
+		# mismatches. Stops after maxMismatches mismatches.
+		streams = [iter(chunks1), iter(chunks2)]
+		buffers = ["", ""]
+		positions = [0, 0]
+
+		def fill(i):
+			# Makes buffers[i] hold unread text; False once stream i is exhausted
+			while positions[i] == len(buffers[i]):
+				if streams[i] is None:
+					return False
+				chunk = next(streams[i], None)
+				if chunk is None:
+					streams[i] = None
+					buffers[i] = ""
+				else:
+					buffers[i] = chunk
+				positions[i] = 0
+			return True
+
+		def skipLine(i):
+			# Drops the rest of the current line of stream i
+			while fill(i):
+				end = buffers[i].find("\n", positions[i])
+				if end >= 0:
+					positions[i] = end + 1
+					return
+				positions[i] = len(buffers[i])
+
+		lineNum = 1
+		column = 1
+		mismatches = 0
+		while True:
+			more1 = fill(0)
+			more2 = fill(1)
+			if not more1 and not more2:
+				break
+			message = None
+			if more1 and more2:
+				b1, b2 = buffers
+				p1, p2 = positions
+				n = min(len(b1) - p1, len(b2) - p2)
+				if column - 1 + n <= self.MAX_LINE and b1[p1:p1 + n] == b2[p2:p2 + n]:
+					# Equal, and too short to hold an over-long line: take it whole
+					positions[0] += n
+					positions[1] += n
+					last = b1.rfind("\n", p1, p1 + n)
+					if last >= 0:
+						lineNum += b1.count("\n", p1, p1 + n)
+						column = p1 + n - last
+					else:
+						column += n
+					continue
+				# Otherwise compare at most to the end of the current line of the first file
+				end = b1.find("\n", p1, p1 + n)
+				if end >= 0:
+					n = end - p1 + 1
+				part1 = b1[p1:p1 + n]
+				part2 = b2[p2:p2 + n]
+				same = n if part1 == part2 else self.firstDifference(part1, part2) - 1
+				positions[0] += same
+				positions[1] += same
+				lineEnd = same == n and end >= 0
+				if column - 1 + same - lineEnd > self.MAX_LINE:
+					message = "Line " + str(lineNum) + " is longer than " + str(self.MAX_LINE) + " characters."
+				elif same < n:
+					message = "Mismatch at line " + str(lineNum) + ", column " + str(column + same) + "."
+				elif lineEnd:
+					lineNum += 1
+					column = 1
+				else:
+					column += same
+			else:
+				message = "Mismatch at line " + str(lineNum) + ", column " + str(column) + "."
+			if message is None:
+				continue
+			self.printSev(self.LOW, bcolors.FAIL + message + bcolors.ENDC)
+			mismatches += 1
+			if mismatches >= self.maxMismatches:
+				break
+			skipLine(0)
+			skipLine(1)
+			lineNum += 1
+			column = 1
+
+		return mismatches == 0
+
+	def diffFiles(self, path1, path2):
+		return self.diff(self.readChunks(path1), self.readChunks(path2))
+
+	def __init__(self, verb, enable,operating_system, jobs = 1, inProcess = False, maxMismatches = 1, timeout = 30, maxMemory = None, cache = None):
 		self.verbose = verb
+		self.maxMismatches = maxMismatches
+		self.timeout = timeout
+		self.maxMemory = maxMemory
+		self.cache = cache
 		self.enable = enable
 		self.operating_system = operating_system
+		self.jobs = jobs
+		self.inProcess = inProcess
+		self.runners = {}
 	
 	def grade(self):
 		raise NotImplementedError("Please Implement this method")
\ No newline at end of file
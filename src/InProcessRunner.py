@@ -0,0 +1,149 @@
+# Runs a submission's entry point (Assembler.assembler / Simulator.simulate)
+# inside the grading process, so each test does not pay for a new interpreter
+
+import copy
+import ctypes
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import threading
+import traceback
+import types
+from contextlib import redirect_stdout, redirect_stderr
+
+class TestTimeout(BaseException):
+	# Raised inside a submission that runs past its time limit. Not an
+	# Exception, so the submission's own `except Exception` does not catch it
+	pass
+
+class Watchdog:
+	# Raises TestTimeout in the calling thread once timeout seconds have
+	# passed, unless stop() is called first. The exception is delivered
+	# between two Python bytecodes, so a single long-running C call (say, a
+	# huge multiplication) is only interrupted once it returns.
+
+	def __init__(self, timeout):
+		self.thread = ctypes.c_ulong(threading.get_ident())
+		self.lock = threading.Lock()
+		self.active = True
+		self.fired = False
+		self.timer = threading.Timer(timeout, self.fire)
+		self.timer.daemon = True
+		self.timer.start()
+
+	def fire(self):
+		with self.lock:
+			if self.active:
+				self.fired = True
+				ctypes.pythonapi.PyThreadState_SetAsyncExc(self.thread, ctypes.py_object(TestTimeout))
+
+	def stop(self):
+		with self.lock:
+			self.active = False
+			if self.fired:
+				# The test finished before the exception was delivered
+				ctypes.pythonapi.PyThreadState_SetAsyncExc(self.thread, None)
+		self.timer.cancel()
+
+class InProcessRunner:
+
+	# Module globals of these types are code, not state, and are not reset
+	CODE_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+
+	def __init__(self, runDir, script, entryPoint):
+		self.runDir = os.path.abspath(runDir)
+		self.script = script
+		self.entryPoint = entryPoint
+		# Submissions keep their state in module globals, so one test at a time
+		self.lock = threading.Lock()
+		self.module = None
+		self.entry = None
+		self.names = set()
+		self.state = {}
+
+	def load(self):
+		# Imports the submission once. Raises if it cannot be imported or has
+		# no callable entry point; callers then fall back to subprocesses.
+		path = os.path.join(self.runDir, self.script)
+		name = "submission_" + os.path.splitext(self.script)[0] + "_" + str(abs(hash(self.runDir)))
+		spec = importlib.util.spec_from_file_location(name, path)
+		if spec is None:
+			raise ImportError("cannot import " + path)
+		module = importlib.util.module_from_spec(spec)
+		before = set(sys.modules)
+		sys.path.insert(0, self.runDir)
+		try:
+			with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+				spec.loader.exec_module(module)
+		finally:
+			sys.path.remove(self.runDir)
+			# Forget helper modules imported from the submission directory, so
+			# another submission with a helper of the same name gets its own
+			for modName in set(sys.modules) - before:
+				modFile = getattr(sys.modules[modName], "__file__", None)
+				if modFile and os.path.dirname(os.path.abspath(modFile)) == self.runDir:
+					del sys.modules[modName]
+
+		entry = getattr(module, self.entryPoint, None)
+		if not callable(entry):
+			raise ImportError(path + " has no function " + self.entryPoint)
+		self.module = module
+		self.entry = entry
+		self.names = set(vars(module))
+		self.state = {}
+		for key, value in vars(module).items():
+			if key.startswith("__") or isinstance(value, self.CODE_TYPES):
+				continue
+			try:
+				self.state[key] = copy.deepcopy(value)
+			except Exception:
+				pass
+		return self
+
+	def reset(self):
+		# Restores the module globals to their state right after import
+		namespace = vars(self.module)
+		for key in list(namespace):
+			if key not in self.names:
+				del namespace[key]
+		for key, value in self.state.items():
+			namespace[key] = copy.deepcopy(value)
+
+	def run(self, args, timeout = None):
+		# Calls entryPoint(input_file, output_file) and returns a
+		# subprocess.CompletedProcess with the captured output. Raises
+		# TestTimeout if the call takes more than timeout seconds
+		output = io.StringIO()
+		with self.lock:
+			self.reset()
+			sys.path.insert(0, self.runDir)
+			try:
+				watchdog = Watchdog(timeout) if timeout else None
+				try:
+					with redirect_stdout(output), redirect_stderr(output):
+						self.entry(*args[:2])
+				finally:
+					if watchdog is not None:
+						watchdog.stop()
+				returncode = 0
+			except SystemExit as e:
+				returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+				if e.code is not None and not isinstance(e.code, int):
+					output.write(str(e.code) + "\n")
+			except Exception:
+				output.write(traceback.format_exc())
+				returncode = 1
+			finally:
+				sys.path.remove(self.runDir)
+		return subprocess.CompletedProcess(args, returncode, output.getvalue())
+
+def loadRunner(runDir, script, entryPoint, warn):
+	# The submission imported once, or None after passing the import error to
+	# warn, in which case the caller runs it in subprocesses instead
+	try:
+		return InProcessRunner(runDir, script, entryPoint).load()
+	except Exception as e:
+		warn(e)
+		return None
@@ -0,0 +1,140 @@
+# On-disk cache of graded test results, so re-grading only runs the
+# (submission, test) pairs that changed
+#
+# An entry is keyed on the SHA-256 of the submission's source files, the
+# test's input program and its golden output. It holds the run's captured
+# output, whether it passed, and a copy of the file the submission
+# generated, which is put back in place on a hit. Entries are evicted
+# least recently used first once the cache grows past maxBytes.
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+class ResultCache:
+
+	# Bytes read from a file at a time while hashing
+	HASH_CHUNK = 1 << 20
+
+	def __init__(self, directory, maxBytes):
+		self.directory = os.path.abspath(directory)
+		self.maxBytes = maxBytes
+		self.submissions = {}
+		# Batch grading uses the cache from several threads
+		self.lock = threading.RLock()
+		os.makedirs(self.directory, exist_ok=True)
+		# key -> [last use, size in bytes], from the files on disk
+		self.entries = {}
+		for name in os.listdir(self.directory):
+			key, ext = os.path.splitext(name)
+			if ext not in (".json", ".out"):
+				continue
+			stat = os.stat(os.path.join(self.directory, name))
+			entry = self.entries.setdefault(key, [0, 0])
+			entry[0] = max(entry[0], stat.st_mtime)
+			entry[1] += stat.st_size
+		self.size = sum(entry[1] for entry in self.entries.values())
+
+	def hashFile(self, path, digest):
+		try:
+			f = open(path, 'rb')
+		except FileNotFoundError:
+			digest.update(b"\0missing")
+			return
+		with f:
+			for chunk in iter(lambda: f.read(self.HASH_CHUNK), b""):
+				digest.update(chunk)
+
+	def hashSubmission(self, runDir, script):
+		# Hash of every .py file under runDir, so a change to a helper module
+		# of the submission counts as a new submission
+		with self.lock:
+			key = (runDir, script)
+			if key not in self.submissions:
+				digest = hashlib.sha256(script.encode())
+				for root, dirs, files in os.walk(runDir):
+					dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+					for name in sorted(files):
+						if name.endswith(".py"):
+							path = os.path.join(root, name)
+							digest.update(b"\0" + os.path.relpath(path, runDir).encode() + b"\0")
+							self.hashFile(path, digest)
+				self.submissions[key] = digest.hexdigest()
+			return self.submissions[key]
+
+	def key(self, submission, inputFile, expectedFile):
+		digest = hashlib.sha256(submission.encode())
+		for path in (inputFile, expectedFile):
+			part = hashlib.sha256()
+			self.hashFile(path, part)
+			digest.update(part.digest())
+		return digest.hexdigest()
+
+	def paths(self, key):
+		base = os.path.join(self.directory, key)
+		return base + ".json", base + ".out"
+
+	def get(self, key, args, outputFile):
+		# The stored result of key as a subprocess.CompletedProcess with
+		# .passed set, after copying the stored output to outputFile; None on a miss
+		with self.lock:
+			if key not in self.entries:
+				return None
+			metaPath, outPath = self.paths(key)
+			try:
+				with open(metaPath, 'r') as f:
+					meta = json.load(f)
+				if meta["output"]:
+					shutil.copyfile(outPath, outputFile)
+			except (OSError, ValueError, KeyError):
+				self.remove(key)
+				return None
+			now = time.time()
+			os.utime(metaPath, (now, now))
+			self.entries[key][0] = now
+			result = subprocess.CompletedProcess(args, meta["returncode"], meta["stdout"])
+			result.passed = meta["passed"]
+			return result
+
+	def put(self, key, result, outputFile, passed):
+		# Stores a finished run and the file it generated
+		with self.lock:
+			metaPath, outPath = self.paths(key)
+			output = os.path.exists(outputFile)
+			size = os.path.getsize(outputFile) if output else 0
+			if size > self.maxBytes:
+				return
+			self.remove(key)
+			if output:
+				shutil.copyfile(outputFile, outPath + ".tmp")
+				os.replace(outPath + ".tmp", outPath)
+			# The metadata is written last, so an entry without it is never a hit
+			meta = {"returncode": result.returncode, "stdout": result.stdout, "passed": passed, "output": output}
+			with open(metaPath + ".tmp", 'w') as f:
+				json.dump(meta, f)
+			os.replace(metaPath + ".tmp", metaPath)
+			size += os.path.getsize(metaPath)
+			self.entries[key] = [time.time(), size]
+			self.size += size
+			self.evict()
+
+	def remove(self, key):
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.size -= entry[1]
+		for path in self.paths(key):
+			if os.path.exists(path):
+				os.remove(path)
+
+	def evict(self):
+		# Drops least recently used entries until the cache fits in maxBytes
+		if self.size <= self.maxBytes:
+			return
+		for key in sorted(self.entries, key=lambda key: self.entries[key][0]):
+			self.remove(key)
+			if self.size <= self.maxBytes:
+				break
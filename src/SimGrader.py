@@ -19,8 +19,8 @@ class SimGrader(Grader):
 	TRACE_SIMPLE_DIR = "simple"
 
 
-	def __init__(self, verb, enable,operating_system):
-		super().__init__(verb, enable,operating_system)
+	def __init__(self, verb, enable,operating_system, jobs = 1, inProcess = False, maxMismatches = 1, timeout = 30, maxMemory = None, cache = None):
+		super().__init__(verb, enable,operating_system, jobs, inProcess, maxMismatches, timeout, maxMemory, cache)
 		self.enable = enable
 		self.operating_system = operating_system
 		
@@ -34,55 +34,41 @@ class SimGrader(Grader):
 		passCount = 0
 		totalCount = 0
 		
-		curDir = os.getcwd()
-		if self.operating_system == 'linux':
-			tests = self.listFiles("tests/bin/" + genDir)
-		elif self.operating_system == 'windows':
-			tests = self.listFiles("tests\\bin\\" + genDir)
+		# Absolute paths, so tests can run concurrently without os.chdir
+		runDir = os.path.abspath(self.SIM_RUN_DIR)
+		testDir = os.path.abspath(os.path.join("tests", "bin", genDir))
+		userDir = os.path.abspath(os.path.join("tests", "user_traces", genDir))
+		expectedDir = os.path.abspath(os.path.join("tests", "traces", expDir))
+		tests = self.listFiles(testDir)
 		tests.sort()
-		os.chdir(self.SIM_RUN_DIR)
-		
+		os.makedirs(userDir, exist_ok=True)
+
+		testArgs = []
 		for test in tests:
-			
-			python_command = 'python3 Simulator.py'
-			if self.operating_system == 'linux':
-				machine_code_file = ' ' + '../automatedTesting/tests/bin/' + genDir + '/' + test
-				output_trace_file = ' ' + '../automatedTesting/tests/user_traces/' + genDir + '/' + test
-				output_read_trace_file = ' ' + '../automatedTesting/tests/user_traces/' + genDir + '/' + test.split(".")[0]+"_r.txt"
-				os.remove(output_trace_file) if os.path.exists(output_trace_file) else None; 
-				os.remove(output_read_trace_file) if os.path.exists(output_read_trace_file) else None;
-			elif self.operating_system == 'windows':
-				machine_code_file = ' ' + '..\\automatedTesting\\tests\\bin\\' + genDir + '\\' + test
-				output_trace_file = ' ' + '..\\automatedTesting\\tests\\user_traces\\' + genDir + '\\' + test
-				output_read_trace_file = ' ' + '../automatedTesting/tests/user_traces/' + genDir + '/' + test.split(".")[0]+"_r.txt"
-				os.remove(output_trace_file) if os.path.exists(output_trace_file) else None; 
-				os.remove(output_read_trace_file) if os.path.exists(output_read_trace_file) else None;
-			command = python_command + machine_code_file + output_trace_file + output_read_trace_file
-			os.system(command)
-			
-			
-			generatedTrace = open(output_trace_file.strip(),'r').readlines()
+			machine_code_file = os.path.join(testDir, test)
+			output_trace_file = os.path.join(userDir, test)
+			output_read_trace_file = os.path.join(userDir, test.split(".")[0] + "_r.txt")
+			os.remove(output_trace_file) if os.path.exists(output_trace_file) else None; 
+			os.remove(output_read_trace_file) if os.path.exists(output_read_trace_file) else None;
+			testArgs.append([machine_code_file, output_trace_file, output_read_trace_file])
 
-			if self.operating_system == 'linux':
-				exact_trace_file = "../automatedTesting/tests/traces/" + expDir + "/" + test
-			elif self.operating_system == 'windows':
-				exact_trace_file = "..\\automatedTesting\\tests\\traces\\" + expDir + "\\" + test
-				
-			try:
-				expectedTrace = open(exact_trace_file,'r').readlines()
-			except FileNotFoundError:
+		expectedFiles = [os.path.join(expectedDir, test) for test in tests]
+		results = self.runTestsCached('Simulator.py', 'simulate', testArgs, expectedFiles, runDir)
+		for test, args, exact_trace_file, result in zip(tests, testArgs, expectedFiles, results):
+			self.printSev(self.HIGH, result.stdout, end="")
+			if self.limitExceeded(result, test):
+				totalCount += 1
+				continue
+			if not os.path.exists(exact_trace_file):
 				self.printSev(self.HIGH, bcolors.WARNING + "[Golden Binary Trace File Not Found]\n" + exact_trace_file)
-				expectedTrace = " "
-			
 
-			if self.diff(generatedTrace, expectedTrace):
+			if self.checkResult(result, args[1], exact_trace_file):
 				self.printSev(self.HIGH, bcolors.OKGREEN + "[PASSED]" + bcolors.ENDC + " " + test)
 				passCount += 1
 			else:
 				self.printSev(self.HIGH, bcolors.FAIL + "[FAILED]" + bcolors.ENDC + " " + test)
 			totalCount += 1
 
-		os.chdir(curDir)
 		return passCount, totalCount
 	
 	def grade(self):
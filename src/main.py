@@ -1,15 +1,32 @@
 # Runs automated tests for assembler and simulator
 
+import os
 import sys
 from colors import bcolors
 from AsmGrader import AsmGrader
 from SimGrader import SimGrader
 from Results import Results
+from BatchGrader import BatchGrader
+from ResultCache import ResultCache
 
 
 VERBOSE = False
 GRADE_ASSEMBLER = True
 GRADE_SIMULATOR = True
+# None: 1, or one per core in batch mode
+JOBS = None
+IN_PROCESS = False
+MAX_MISMATCHES = 1
+TIMEOUT = 30
+MAX_MEMORY = None
+USE_CACHE = True
+# Results of earlier runs, reused for unchanged (submission, test) pairs
+CACHE_DIR = ".grader_cache"
+CACHE_SIZE = 256 << 20
+# Batch mode: directory of submissions, result matrix, generated files
+BATCH_DIR = None
+RESULTS_FILE = "results.csv"
+BATCH_OUTPUT_DIR = os.path.join("tests", "user_batch")
 
 def printHelp():
 	print('----Please enter in correct format----')
@@ -18,20 +35,53 @@ def printHelp():
 	print("--no-sim to not grade simulator")
 	print("--linux for Linux operating system")
 	print("--windows for windows operating system")
+	print("--jobs N to run N tests at a time (default 1, or the number of cores with --batch)")
+	print("--max-mismatches N to report up to N mismatching lines per test before giving up (default 1)")
+	print("--timeout SECONDS to stop a test after SECONDS of wall-clock time, 0 for no limit (default 30)")
+	print("--max-memory MB to stop a test that uses more than MB megabytes (runs every test as a subprocess)")
+	print("--no-cache to run every test again instead of reusing results of unchanged submissions and tests")
+	print("--in-process to call the submission inside the grader instead of starting python3 per test")
+	print("--batch DIR to grade every submission in DIR (each laid out like ../SimpleAssembler and ../SimpleSimulator)")
+	print("--results FILE for the --batch result matrix, CSV or .json (default " + RESULTS_FILE + ")")
 	print("Example_linux: $python3 src/main.py --linux --no-sim")
 	print("Example_windows: >python3 src\main.py --windows --no-sim")
 
+def optionValue(arg, name, args, minimum):
+	# Integer value of --name N or --name=N; prints help and exits if it is not >= minimum
+	value = arg[len(name) + 1:] if arg.startswith(name + "=") else next(args, "")
+	if not value.isdigit() or int(value) < minimum:
+		printHelp()
+		exit()
+	return int(value)
+
+def optionString(arg, name, args):
+	# Value of --name VALUE or --name=VALUE; prints help and exits if it is empty
+	value = arg[len(name) + 1:] if arg.startswith(name + "=") else next(args, "")
+	if value == "":
+		printHelp()
+		exit()
+	return value
+
 def setupArgs():
 	global VERBOSE
 	global GRADE_ASSEMBLER
 	global GRADE_SIMULATOR
 	global OPERATING_SYSTEM
+	global JOBS
+	global IN_PROCESS
+	global MAX_MISMATCHES
+	global TIMEOUT
+	global MAX_MEMORY
+	global USE_CACHE
+	global BATCH_DIR
+	global RESULTS_FILE
 
 	if len(sys.argv) < 3:
 		printHelp()
 		exit()
 
-	for arg in sys.argv[1:]:
+	args = iter(sys.argv[1:])
+	for arg in args:
 		if arg == "--verbose":
 			VERBOSE = True
 		elif arg == "--no-asm":
@@ -40,16 +90,48 @@ def setupArgs():
 			GRADE_SIMULATOR = False
 		elif ((arg == "--linux") | (arg == "--windows")):
 			OPERATING_SYSTEM = arg[2:]
+		elif arg == "--no-cache":
+			USE_CACHE = False
+		elif arg == "--in-process":
+			IN_PROCESS = True
+		elif arg == "--jobs" or arg.startswith("--jobs="):
+			JOBS = optionValue(arg, "--jobs", args, 1)
+		elif arg == "--max-mismatches" or arg.startswith("--max-mismatches="):
+			MAX_MISMATCHES = optionValue(arg, "--max-mismatches", args, 1)
+		elif arg == "--timeout" or arg.startswith("--timeout="):
+			TIMEOUT = optionValue(arg, "--timeout", args, 0) or None
+		elif arg == "--max-memory" or arg.startswith("--max-memory="):
+			MAX_MEMORY = optionValue(arg, "--max-memory", args, 1)
+		elif arg == "--batch" or arg.startswith("--batch="):
+			BATCH_DIR = optionString(arg, "--batch", args)
+		elif arg == "--results" or arg.startswith("--results="):
+			RESULTS_FILE = optionString(arg, "--results", args)
 		else:
 			printHelp()
 			exit()
 			# break
 
+def gradeBatch(cache):
+	components = []
+	if GRADE_ASSEMBLER:
+		components.append("assembler")
+	if GRADE_SIMULATOR:
+		components.append("simulator")
+	grader = BatchGrader(BATCH_DIR, BATCH_OUTPUT_DIR, components, OPERATING_SYSTEM, JOBS or os.cpu_count() or 1, TIMEOUT, MAX_MEMORY, cache)
+	columns, matrix = grader.grade()
+	grader.writeResults(RESULTS_FILE, columns, matrix)
+	print("Graded " + str(len(matrix)) + " submissions on " + str(len(columns)) + " tests: " + RESULTS_FILE)
+
 def main():
 	setupArgs()
+	cache = ResultCache(CACHE_DIR, CACHE_SIZE) if USE_CACHE else None
+
+	if BATCH_DIR is not None:
+		gradeBatch(cache)
+		return
 
-	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM)
-	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM)
+	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM, JOBS or 1, IN_PROCESS, MAX_MISMATCHES, TIMEOUT, MAX_MEMORY, cache)
+	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM, JOBS or 1, IN_PROCESS, MAX_MISMATCHES, TIMEOUT, MAX_MEMORY, cache)
 
 	asmRes = asmGrader.grade()
 	simRes = simGrader.grade()	
@@ -1,12 +1,19 @@
 import os
 import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from InProcessRunner import loadRunner
 
 def normalized_file_content(filepath):
     with open(filepath, 'r') as f:
         # Remove trailing whitespace (including newline characters) from each line
         return [line.rstrip() for line in f.readlines()]
 
-def run_test(test_dir, expected_dir, output_dir, assembler_cmd):
+def warn(error):
+    print(f"In-process import failed ({error}), using subprocesses.")
+
+def run_test(test_dir, expected_dir, output_dir, assembler_cmd, runner=None):
     test_files = [f for f in os.listdir(test_dir) if f.endswith('.txt')]
     passed = 0
     total = len(test_files)
@@ -20,8 +27,11 @@ def run_test(test_dir, expected_dir, output_dir, assembler_cmd):
         output_path = os.path.join(output_dir, test_file)
         
         # Run the assembler with the current test case
-        result = subprocess.run(assembler_cmd + [input_path, output_path],
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if runner is not None:
+            result = runner.run([input_path, output_path])
+        else:
+            result = subprocess.run(assembler_cmd + [input_path, output_path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         
         if result.returncode != 0:
             print(f"{test_file}: FAIL (Assembler error)")
@@ -45,15 +55,25 @@ if __name__ == "__main__":
     simple_expected = 'tests/assembly/bin_s'
     simple_output = 'tests/assembly/user_bin_s'
     
+    # Forward references and duplicate labels, which the single-pass assembler backpatches
+    regression_input = 'tests/assembly/regressionBin'
+    regression_expected = 'tests/assembly/bin_r'
+    regression_output = 'tests/assembly/user_bin_r'
+    
     hard_input = 'tests/assembly/hardBin'
     hard_expected = 'tests/assembly/bin_h'
     hard_output = 'tests/assembly/user_bin_h'
     
     # Define the assembler command (adjust if needed)
     assembler_cmd = ['python3', 'Assembler.py']
+    # --in-process imports Assembler.py once instead of starting python3 per test
+    runner = loadRunner('.', 'Assembler.py', 'assembler', warn) if '--in-process' in sys.argv else None
     
     print("Running simple tests:")
-    run_test(simple_input, simple_expected, simple_output, assembler_cmd)
+    run_test(simple_input, simple_expected, simple_output, assembler_cmd, runner)
+    
+    print("\nRunning regression tests:")
+    run_test(regression_input, regression_expected, regression_output, assembler_cmd, runner)
     
     print("\nRunning hard tests:")
-    run_test(hard_input, hard_expected, hard_output, assembler_cmd)
+    run_test(hard_input, hard_expected, hard_output, assembler_cmd, runner)
@@ -0,0 +1,218 @@
+import sys
+import subprocess
+import os
+import csv
+import json
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from BatchGrader import BatchGrader
+from ResultCache import ResultCache
+
+# A stand-in submission script: writes the golden output of the test it is
+# given, or a wrong one if BROKEN or $GRADER_TEST_BROKEN is set.
+FAKE_SCRIPT = '''import os
+import shutil
+import sys
+
+DIRS = {dirs!r}
+BROKEN = {broken!r}
+input_file, output_file = sys.argv[1], sys.argv[2]
+if BROKEN or os.environ.get('GRADER_TEST_BROKEN'):
+    with open(output_file, 'w') as f:
+        f.write('0\\n')
+else:
+    shutil.copyfile(os.path.join(DIRS[os.path.dirname(input_file)], os.path.basename(input_file)), output_file)
+'''
+
+def write_file(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def write_submission(submission_dir, components, broken=False):
+    """
+    Creates a submission with a stand-in script for each component
+    ("assembler", "simulator") in components, laid out as BatchGrader expects.
+    """
+    for component in components:
+        suites = [suite for suite in BatchGrader.SUITES if suite.component == component]
+        dirs = {os.path.abspath(suite.testDir): os.path.abspath(suite.expectedDir) for suite in suites}
+        run_dir = os.path.join(submission_dir, suites[0].runDir)
+        os.makedirs(run_dir, exist_ok=True)
+        write_file(os.path.join(run_dir, suites[0].script), FAKE_SCRIPT.format(dirs=dirs, broken=broken))
+
+def run_main(args, broken=False):
+    """
+    Runs src/main.py with args, with $GRADER_TEST_BROKEN set if broken.
+    """
+    env = dict(os.environ)
+    env.pop('GRADER_TEST_BROKEN', None)
+    if broken:
+        env['GRADER_TEST_BROKEN'] = '1'
+    platform = '--windows' if os.name == 'nt' else '--linux'
+    return subprocess.run(['python3', os.path.join('src', 'main.py'), platform] + args, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def read_matrix(path):
+    """
+    The rows of a CSV result matrix as {submission: {column: value}}.
+    """
+    with open(path, 'r', newline='') as f:
+        return {row['submission']: row for row in csv.DictReader(f)}
+
+def report(name, passed):
+    print(f"Test {'PASSED' if passed else 'FAILED'} for {name}.")
+    return passed
+
+def run_cache_tests(work_dir):
+    """
+    Stores a result in a ResultCache and reads it back. A hit must return the
+    stored result and restore the output file, also through a new
+    ResultCache on the same directory; changing the golden output or a
+    module of the submission must miss; and once the cache outgrows its
+    limit, the least recently used entry must be evicted first.
+    """
+    cache_dir = os.path.join(work_dir, 'cache')
+    submission_dir = os.path.join(work_dir, 'submission')
+    os.makedirs(submission_dir)
+    input_file, expected_file, output_file, restored_file = (
+        os.path.join(work_dir, name) for name in ('input.txt', 'expected.txt', 'output.txt', 'restored.txt'))
+    write_file(os.path.join(submission_dir, 'Simulator.py'), 'pass\n')
+    write_file(input_file, 'add zero,zero,zero\n')
+    write_file(expected_file, 'expected\n')
+    write_file(output_file, 'output\n')
+    args = [input_file, restored_file]
+    all_passed = True
+
+    cache = ResultCache(cache_dir, 1 << 20)
+    key = cache.key(cache.hashSubmission(submission_dir, 'Simulator.py'), input_file, expected_file)
+    miss = cache.get(key, args, restored_file)
+    cache.put(key, subprocess.CompletedProcess(args, 0, 'captured'), output_file, True)
+    hit = ResultCache(cache_dir, 1 << 20).get(key, args, restored_file)
+    all_passed &= report("ResultCache hit", miss is None and hit is not None and hit.returncode == 0
+                         and hit.stdout == 'captured' and hit.passed and read_file(restored_file) == 'output\n')
+
+    write_file(expected_file, 'changed\n')
+    changed_expected = cache.key(cache.hashSubmission(submission_dir, 'Simulator.py'), input_file, expected_file)
+    write_file(os.path.join(submission_dir, 'helper.py'), 'pass\n')
+    fresh = ResultCache(cache_dir, 1 << 20)
+    changed_submission = fresh.key(fresh.hashSubmission(submission_dir, 'Simulator.py'), input_file, expected_file)
+    all_passed &= report("ResultCache miss on changed inputs",
+                         len({key, changed_expected, changed_submission}) == 3
+                         and cache.get(changed_expected, args, restored_file) is None
+                         and fresh.get(changed_submission, args, restored_file) is None)
+
+    # Room for two entries of about 1000 bytes each, but not three
+    shutil.rmtree(cache_dir)
+    write_file(output_file, '0' * 1000)
+    cache = ResultCache(cache_dir, 2500)
+    keys = [cache.key(name, input_file, expected_file) for name in ('a', 'b', 'c')]
+    cache.put(keys[0], subprocess.CompletedProcess(args, 0, ''), output_file, True)
+    cache.put(keys[1], subprocess.CompletedProcess(args, 0, ''), output_file, True)
+    cache.get(keys[0], args, restored_file)
+    cache.put(keys[2], subprocess.CompletedProcess(args, 0, ''), output_file, True)
+    kept = [cache.get(key, args, restored_file) is not None for key in keys]
+    all_passed &= report("ResultCache LRU eviction", kept == [True, False, True] and cache.size <= 2500)
+    return all_passed
+
+def run_no_cache_tests(work_dir):
+    """
+    Grades a submission in batch mode, then again after its output has
+    broken without any change to its files: the cached run must still pass
+    every test and the --no-cache run must fail them all.
+    """
+    submissions_dir = os.path.join(work_dir, 'submissions')
+    results_file = os.path.join(work_dir, 'results.csv')
+    write_submission(os.path.join(submissions_dir, 'cached'), ['simulator'])
+    all_passed = True
+    for name, options, broken, expected in [
+        ("batch grading", [], False, 'PASSED'),
+        ("batch grading from the cache", [], True, 'PASSED'),
+        ("batch grading --no-cache", ['--no-cache'], True, 'FAILED'),
+    ]:
+        result = run_main(['--no-asm', '--batch', submissions_dir, '--results', results_file] + options, broken)
+        row = read_matrix(results_file)['cached'] if result.returncode == 0 else {}
+        statuses = [value for column, value in row.items() if column.startswith('simulator/')]
+        all_passed &= report(name, bool(statuses) and all(status == expected for status in statuses))
+    return all_passed
+
+def run_batch_tests(work_dir):
+    """
+    Grades three submissions in batch mode: one that passes every test, one
+    with only a simulator that fails, and an empty one. The CSV and JSON
+    result matrices must list every test, give each cell its status, with
+    MISSING where a submission has no script, and sum the marks.
+    """
+    submissions_dir = os.path.join(work_dir, 'submissions')
+    write_submission(os.path.join(submissions_dir, 'complete'), ['assembler', 'simulator'])
+    write_submission(os.path.join(submissions_dir, 'failing'), ['simulator'], broken=True)
+    os.makedirs(os.path.join(submissions_dir, 'empty'))
+
+    columns = []
+    for suite in BatchGrader.SUITES:
+        if os.path.isdir(suite.testDir):
+            columns += [f"{suite.component}/{suite.name.lower()}/{test}" for test in sorted(os.listdir(suite.testDir))]
+    marks = {}
+    for suite in BatchGrader.SUITES:
+        tests = len(os.listdir(suite.testDir)) if os.path.isdir(suite.testDir) else 0
+        marks[suite.component] = marks.get(suite.component, 0) + tests * suite.marks
+    expected = {
+        'complete': ({column: 'PASSED' for column in columns},
+                     {'assembler': marks['assembler'], 'simulator': marks['simulator'], 'total': sum(marks.values())}),
+        'empty': ({column: 'MISSING' for column in columns}, {'assembler': 0, 'simulator': 0, 'total': 0}),
+        'failing': ({column: 'MISSING' if column.startswith('assembler/') else 'FAILED' for column in columns},
+                    {'assembler': 0, 'simulator': 0, 'total': 0}),
+    }
+    all_passed = True
+
+    results_file = os.path.join(work_dir, 'results.csv')
+    result = run_main(['--batch', submissions_dir, '--results', results_file, '--no-cache'])
+    passed = result.returncode == 0
+    if passed:
+        with open(results_file, 'r', newline='') as f:
+            header = next(csv.reader(f))
+        rows = read_matrix(results_file)
+        passed = header == ['submission', 'assembler', 'simulator', 'total'] + columns and sorted(rows) == sorted(expected)
+        for submission, (statuses, submission_marks) in expected.items():
+            row = rows.get(submission, {})
+            passed &= all(row.get(column) == status for column, status in statuses.items())
+            passed &= all(abs(float(row.get(name) or 'nan') - value) < 1e-9 for name, value in submission_marks.items())
+    all_passed &= report("batch grading CSV matrix", passed)
+
+    results_file = os.path.join(work_dir, 'results.json')
+    result = run_main(['--batch', submissions_dir, '--results', results_file, '--no-cache'])
+    passed = result.returncode == 0
+    if passed:
+        with open(results_file, 'r') as f:
+            data = json.load(f)
+        passed = data['tests'] == columns and sorted(data['submissions']) == sorted(expected)
+        for submission, (statuses, submission_marks) in expected.items():
+            entry = data['submissions'].get(submission, {'results': {}, 'marks': {}})
+            passed &= entry['results'] == statuses
+            passed &= all(abs(entry['marks'].get(name, float('nan')) - value) < 1e-9 for name, value in submission_marks.items())
+    all_passed &= report("batch grading JSON matrix", passed)
+    return all_passed
+
+if __name__ == "__main__":
+    # Grader tests run from the directory of this file, like the graders;
+    # batch mode writes generated files to tests/user_batch.
+    work_dir = tempfile.mkdtemp()
+    try:
+        print("Running result cache tests:")
+        cache_passed = run_cache_tests(os.path.join(work_dir, 'cache'))
+        cache_passed &= run_no_cache_tests(os.path.join(work_dir, 'no_cache'))
+
+        print("\nRunning batch grading tests:")
+        batch_passed = run_batch_tests(os.path.join(work_dir, 'batch'))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if cache_passed and batch_passed:
+        print("\nAll grader tests PASSED!")
+    else:
+        print("\nSome grader tests FAILED!")
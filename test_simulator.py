@@ -2,17 +2,31 @@ import sys
 import subprocess
 import difflib
 import os
+import re
+import shutil
 
-def run_test(input_file, expected_file, output_file, cmd):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from InProcessRunner import loadRunner
+
+def warn(error):
+    print(f"In-process import failed ({error}), using subprocesses.")
+
+def run_test(input_file, expected_file, output_file, cmd, runner=None):
     """
-    Runs the simulator on a single test input file using the provided command,
-    writes the output to output_file, and compares it with expected_file.
+    Runs the simulator on a single test input file using the provided command
+    (or the in-process runner), writes the output to output_file, and compares
+    it with expected_file.
     """
-    full_cmd = cmd + [input_file, output_file]
-    result = subprocess.run(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if runner is not None:
+        result = runner.run([input_file, output_file])
+        errors = result.stdout
+    else:
+        full_cmd = cmd + [input_file, output_file]
+        result = subprocess.run(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        errors = result.stderr.decode()
     if result.returncode != 0:
         print(f"Error running simulator on {input_file}:")
-        print(result.stderr.decode())
+        print(errors)
         return False
 
     with open(expected_file, 'r') as f:
@@ -29,7 +43,7 @@ def run_test(input_file, expected_file, output_file, cmd):
         print(f"Test PASSED for {input_file}.")
         return True
 
-def run_tests_in_directory(input_dir, expected_dir, output_dir, cmd):
+def run_tests_in_directory(input_dir, expected_dir, output_dir, cmd, runner=None):
     """
     Iterates over each file in the input directory and runs a test.
     The expected and output directories should have matching filenames.
@@ -44,31 +58,335 @@ def run_tests_in_directory(input_dir, expected_dir, output_dir, cmd):
         expected_path = os.path.join(expected_dir, test_file)
         output_path = os.path.join(output_dir, test_file)
         print(f"Running test for {test_file}:", end=" ")
-        passed = run_test(input_path, expected_path, output_path, cmd)
+        passed = run_test(input_path, expected_path, output_path, cmd, runner)
         if not passed:
             all_passed = False
     return all_passed
 
+def expected_trace(expected_dir, test_file):
+    """
+    Expected trace of a program: the file of the same name with a .txt
+    extension, so the text and .bin forms of a program share one trace.
+    """
+    with open(os.path.join(expected_dir, os.path.splitext(test_file)[0] + '.txt'), 'r') as f:
+        return f.readlines()
+
+def run_simulator(cmd, args, timeout=60):
+    """
+    Runs the simulator with args and returns its exit status, or None if it
+    had not finished after timeout seconds.
+    """
+    try:
+        return subprocess.run(cmd + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=timeout).returncode
+    except subprocess.TimeoutExpired:
+        return None
+
+def run_option_tests(input_dir, expected_dir, output_dir, cmd, option_sets):
+    """
+    Runs every program in input_dir once with each list of options in
+    option_sets. Every run must write the program's expected trace.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(input_dir)):
+        expected_lines = expected_trace(expected_dir, test_file)
+        for options in option_sets:
+            output_path = os.path.join(output_dir, test_file)
+            returncode = run_simulator(cmd, [os.path.join(input_dir, test_file), output_path] + options)
+            with open(output_path, 'r') as f:
+                output_lines = f.readlines()
+            name = " ".join([test_file] + options)
+            if returncode == 0 and output_lines == expected_lines:
+                print(f"Test PASSED for {name}.")
+            else:
+                print(f"Test FAILED for {name}.")
+                all_passed = False
+    return all_passed
+
+def golden_trace(lines):
+    """
+    The 0b-prefixed golden form of a decimal text trace, as tracefile.py
+    --golden writes it.
+    """
+    golden = []
+    for line in lines:
+        if line.startswith('0x'):
+            address, value = line.rstrip('\n').split(':')
+            golden.append(f"{address}:0b{int(value):032b}\n")
+        else:
+            golden.append(' '.join(f"0b{int(value):032b}" for value in line.split()) + ' \n')
+    return golden
+
+def run_trace_format_tests(input_dir, expected_dir, output_dir, cmd, trace_formats):
+    """
+    Runs every program in input_dir once with each --trace-format in
+    trace_formats and converts the trace back with tracefile.py. The
+    converted trace must be byte for byte the expected text trace, and with
+    --golden its 0b-prefixed form.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(input_dir)):
+        expected_lines = expected_trace(expected_dir, test_file)
+        output_path = os.path.join(output_dir, test_file)
+        for trace_format in trace_formats:
+            trace_path = f"{output_path}.{trace_format}"
+            returncode = run_simulator(cmd, [os.path.join(input_dir, test_file), trace_path,
+                                             '--trace-format', trace_format])
+            for options, expected in [([], ''.join(expected_lines)),
+                                      (['--golden'], ''.join(golden_trace(expected_lines)))]:
+                converted = subprocess.run(['python3', 'tracefile.py', trace_path, output_path] + options,
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                with open(output_path, 'rb') as f:
+                    output = f.read()
+                name = " ".join([test_file, '--trace-format', trace_format] + options)
+                if returncode == 0 and converted.returncode == 0 and output == expected.encode():
+                    print(f"Test PASSED for {name}.")
+                else:
+                    print(f"Test FAILED for {name}.")
+                    all_passed = False
+    return all_passed
+
+def run_delta_reader_tests(input_dir, expected_dir, output_dir, interval):
+    """
+    Writes a delta trace with a checkpoint every `interval` steps for every
+    program in input_dir and reads it back with DeltaTraceReader: iterating
+    and state_at(n) for every step must give the states of the expected
+    trace, and state_at() past the last step must raise IndexError.
+    """
+    import Simulator
+    from tracefile import DeltaTrace, DeltaTraceReader
+
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(input_dir)):
+        expected_states = [(int(line.split()[0]), [int(value) for value in line.split()[1:]])
+                           for line in expected_trace(expected_dir, test_file) if not line.startswith('0x')]
+        trace_path = os.path.join(output_dir, f"{test_file}.delta")
+        machine = Simulator.Machine()
+        machine.load(os.path.join(input_dir, test_file))
+        with DeltaTrace(trace_path, interval=interval) as trace:
+            machine.execute(trace)
+            trace.close(machine.memory.dump(), machine.memory.dump_label)
+        with DeltaTraceReader(trace_path) as reader:
+            passed = list(reader) == expected_states
+            passed &= all(reader.state_at(n) == state for n, state in enumerate(expected_states))
+            try:
+                reader.state_at(len(expected_states))
+                passed = False
+            except IndexError:
+                pass
+        if passed:
+            print(f"Test PASSED for {test_file} DeltaTraceReader.")
+        else:
+            print(f"Test FAILED for {test_file} DeltaTraceReader.")
+            all_passed = False
+    return all_passed
+
+def run_profile_tests(source_dir, expected_dir, output_dir, assembler_cmd, cmd):
+    """
+    Assembles every program in source_dir with --source-map and runs it with
+    --profile, once naming the map and once relying on the default
+    <program>.map. The trace must be the expected one, the report must give
+    the number of steps in it, every "line N: text" it shows must be line N
+    of the source, and both runs must write the same report.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(source_dir)):
+        source_path = os.path.join(source_dir, test_file)
+        with open(source_path, 'r') as f:
+            source_lines = f.read().splitlines()
+        expected_lines = expected_trace(expected_dir, test_file)
+        program_path = os.path.join(output_dir, test_file)
+        map_path = program_path + '.map'
+        trace_path = program_path + '.trace'
+        subprocess.run(assembler_cmd + [source_path, program_path, '--source-map', map_path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        reports = []
+        passed = True
+        for options in [['--source-map', map_path], []]:
+            report_path = program_path + '.profile'
+            returncode = run_simulator(cmd, [program_path, trace_path, '--profile', report_path] + options)
+            with open(trace_path, 'r') as f:
+                passed &= returncode == 0 and f.readlines() == expected_lines
+            with open(report_path, 'r') as f:
+                reports.append(f.read())
+        steps = sum(1 for line in expected_lines if not line.startswith('0x'))
+        sources = re.findall(r'line (\d+): (.*)', reports[0])
+        passed &= reports[0].startswith(f"steps executed: {steps}\n") and reports[0] == reports[1]
+        passed &= bool(sources) and all(source_lines[int(n) - 1].strip() == text for n, text in sources)
+        if passed:
+            print(f"Test PASSED for {test_file} --profile.")
+        else:
+            print(f"Test FAILED for {test_file} --profile.")
+            all_passed = False
+    return all_passed
+
+def run_checkpoint_tests(input_dir, expected_dir, output_dir, cmd, every, start_at_step):
+    """
+    Runs every program in input_dir saving a checkpoint every `every` steps,
+    then again with --resume and with --start-at-step start_at_step. The
+    resumed trace must be the end of the expected trace, and the
+    fast-forwarded one the expected trace without its first start_at_step lines.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(input_dir)):
+        input_path = os.path.join(input_dir, test_file)
+        output_path = os.path.join(output_dir, test_file)
+        checkpoint_dir = output_path + '.checkpoints'
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        expected_lines = expected_trace(expected_dir, test_file)
+        checkpoint_options = ['--checkpoint-dir', checkpoint_dir]
+        run_simulator(cmd, [input_path, output_path, '--checkpoint-every', str(every)] + checkpoint_options)
+        for options, check in [
+            (['--resume'], lambda lines: 0 < len(lines) < len(expected_lines) and expected_lines[-len(lines):] == lines),
+            (['--start-at-step', str(start_at_step)], lambda lines: lines == expected_lines[start_at_step:]),
+        ]:
+            returncode = run_simulator(cmd, [input_path, output_path] + options + checkpoint_options)
+            with open(output_path, 'r') as f:
+                output_lines = f.readlines()
+            name = " ".join([test_file] + options)
+            if returncode == 0 and check(output_lines):
+                print(f"Test PASSED for {name}.")
+            else:
+                print(f"Test FAILED for {name}.")
+                all_passed = False
+    return all_passed
+
+def run_step_limit_tests(input_dir, output_dir, cmd, max_steps):
+    """
+    Runs every program in input_dir, none of which halts, with --max-steps:
+    from the start (saving checkpoints), resumed from a checkpoint already
+    past a lower limit, and fast-forwarded beyond the limit. Each run must
+    give up with exit status 3 instead of running forever.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    for test_file in sorted(os.listdir(input_dir)):
+        input_path = os.path.join(input_dir, test_file)
+        output_path = os.path.join(output_dir, test_file)
+        checkpoint_dir = output_path + '.checkpoints'
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        checkpoint_options = ['--checkpoint-dir', checkpoint_dir]
+        for options in [
+            ['--max-steps', str(max_steps), '--checkpoint-every', str(max_steps // 2)],
+            ['--max-steps', str(max_steps // 4), '--resume'],
+            ['--max-steps', str(max_steps), '--start-at-step', str(2 * max_steps)],
+        ]:
+            returncode = run_simulator(cmd, [input_path, output_path] + options + checkpoint_options)
+            name = " ".join([test_file] + options)
+            if returncode == 3:
+                print(f"Test PASSED for {name}.")
+            else:
+                print(f"Test FAILED for {name} ({'timed out' if returncode is None else f'exit status {returncode}'}).")
+                all_passed = False
+    return all_passed
+
+def run_batch_tests(input_dir, nonhalting_dir, output_dir, lanes, max_steps):
+    """
+    Runs every program in input_dir through batch.py, one lane per initial
+    value of t0, and compares each lane's trace with the one a single
+    Simulator Machine writes from the same state. The programs in
+    nonhalting_dir must raise StepLimitExceeded under max_steps.
+    Skipped when NumPy is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        print("Batch tests SKIPPED (NumPy is not installed).")
+        return True
+    import Simulator
+    from Assembler import REGISTERS
+    from batch import simulate_batch
+    from tracefile import TextTrace
+
+    os.makedirs(output_dir, exist_ok=True)
+    all_passed = True
+    t0 = REGISTERS['t0']
+    for test_file in sorted(os.listdir(input_dir)):
+        input_path = os.path.join(input_dir, test_file)
+        expected_paths = []
+        for lane, value in enumerate(lanes):
+            machine = Simulator.Machine()
+            machine.load(input_path)
+            machine.registers[t0] = value
+            expected_paths.append(os.path.join(output_dir, f"{test_file}.expected_{lane}"))
+            with TextTrace(expected_paths[-1]) as trace:
+                machine.execute(trace)
+                trace.close(machine.memory.dump(), machine.memory.dump_label)
+        output_paths = [os.path.join(output_dir, f"{test_file}.lane_{lane}") for lane in range(len(lanes))]
+        registers = [[0] * 32 for _ in lanes]
+        for row, value in zip(registers, lanes):
+            row[t0] = value
+        simulate_batch(input_path, output_paths, registers=registers)
+        for lane, (expected_path, output_path) in enumerate(zip(expected_paths, output_paths)):
+            with open(expected_path, 'r') as f:
+                expected_lines = f.readlines()
+            with open(output_path, 'r') as f:
+                output_lines = f.readlines()
+            if output_lines == expected_lines:
+                print(f"Test PASSED for {test_file} batch lane {lane}.")
+            else:
+                print(f"Test FAILED for {test_file} batch lane {lane}.")
+                all_passed = False
+    for test_file in sorted(os.listdir(nonhalting_dir)):
+        output_paths = [os.path.join(output_dir, f"{test_file}.lane_{lane}") for lane in range(len(lanes))]
+        try:
+            simulate_batch(os.path.join(nonhalting_dir, test_file), output_paths, max_steps=max_steps)
+            print(f"Test FAILED for {test_file} batch --max-steps (no StepLimitExceeded).")
+            all_passed = False
+        except Simulator.StepLimitExceeded:
+            print(f"Test PASSED for {test_file} batch --max-steps.")
+    return all_passed
+
 if __name__ == "__main__":
     # Define paths for simple and hard simulator tests.
     simple_input_dir = 'tests/bin/simple'
     simple_expected_dir = 'tests/traces/simple'
     simple_output_dir = 'tests/user_traces/simple'
     
+    # Text and .bin programs run with every execution mode, from checkpoints
+    # and under step limits; these always start python3, as the options do
+    # not apply in-process.
+    regression_input_dir = 'tests/bin/regression'
+    regression_expected_dir = 'tests/traces/regression'
+    regression_output_dir = 'tests/user_traces/regression'
+    nonhalting_input_dir = 'tests/bin/nonhalting'
+    nonhalting_output_dir = 'tests/user_traces/nonhalting'
+    
     hard_input_dir = 'tests/bin/hard'
     hard_expected_dir = 'tests/traces/hard'
     hard_output_dir = 'tests/user_traces/hard'
     
     # Define the simulator command (adjust if needed).
     simulator_cmd = ['python3', 'Simulator.py']
+    # --in-process imports Simulator.py once instead of starting python3 per test
+    runner = loadRunner('.', 'Simulator.py', 'simulate', warn) if '--in-process' in sys.argv else None
     
     print("Running simple simulator tests:")
-    simple_passed = run_tests_in_directory(simple_input_dir, simple_expected_dir, simple_output_dir, simulator_cmd)
+    simple_passed = run_tests_in_directory(simple_input_dir, simple_expected_dir, simple_output_dir, simulator_cmd, runner)
+    
+    print("\nRunning regression simulator tests:")
+    regression_passed = run_option_tests(regression_input_dir, regression_expected_dir, regression_output_dir,
+                                         simulator_cmd, [[], ['--jit'], ['--lazy'], ['--jit', '--lazy']])
+    regression_passed &= run_trace_format_tests(regression_input_dir, regression_expected_dir, regression_output_dir,
+                                                simulator_cmd, ['bin', 'bin-changed', 'delta'])
+    regression_passed &= run_delta_reader_tests(regression_input_dir, regression_expected_dir, regression_output_dir, 5)
+    regression_passed &= run_profile_tests('tests/assembly/regressionBin', regression_expected_dir, regression_output_dir,
+                                           ['python3', 'Assembler.py'], simulator_cmd)
+    regression_passed &= run_checkpoint_tests(regression_input_dir, regression_expected_dir, regression_output_dir,
+                                              simulator_cmd, 8, 12)
+    regression_passed &= run_step_limit_tests(nonhalting_input_dir, nonhalting_output_dir, simulator_cmd, 200)
+    regression_passed &= run_batch_tests(regression_input_dir, nonhalting_input_dir, 'tests/user_traces/batch',
+                                         [0, 7, 29, 30], 200)
     
     print("\nRunning hard simulator tests:")
-    hard_passed = run_tests_in_directory(hard_input_dir, hard_expected_dir, hard_output_dir, simulator_cmd)
+    hard_passed = run_tests_in_directory(hard_input_dir, hard_expected_dir, hard_output_dir, simulator_cmd, runner)
     
-    if simple_passed and hard_passed:
+    if simple_passed and regression_passed and hard_passed:
         print("\nAll simulator tests PASSED!")
     else:
         print("\nSome simulator tests FAILED!")
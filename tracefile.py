@@ -0,0 +1,329 @@
+"""Trace sinks for Simulator.py.
+
+A sink receives the machine state after every executed instruction through
+step(pc, R, rd), where rd is the only register the instruction may have
+written (0 if none), and the memory dump through close(words, base), where
+base is the address the first dumped word is labelled with. Sinks stream to
+disk in fixed-size chunks, so memory use does not grow with run length and a
+killed run still leaves every completed chunk on disk.
+
+Besides the text trace there is a compact binary trace and a delta trace,
+both of which can be rendered back into the decimal text trace or the
+0b-prefixed golden format:
+
+    python3 tracefile.py trace.bin trace.txt [--golden]
+"""
+
+import argparse
+import struct
+
+CHUNK_LINES = 4096
+CHUNK_BYTES = 1 << 16
+MEM_DUMP_BASE = 0x00010000
+
+
+class TextTrace:
+    """The plain-text trace: one "<pc> <x0> ... <x31>" line per step in
+    decimal, followed by a "0x<addr>:<word>" memory dump."""
+
+    def __init__(self, path, chunk_lines=CHUNK_LINES):
+        self.file = open(path, 'w')
+        self.chunk_lines = chunk_lines
+        self.buffer = []
+
+    def step(self, pc, R, rd=0):
+        buffer = self.buffer
+        buffer.append(f"{pc} " + " ".join(map(str, R)) + "\n")
+        if len(buffer) >= self.chunk_lines:
+            self.flush()
+
+    def flush(self):
+        self.file.writelines(self.buffer)
+        self.buffer.clear()
+
+    def close(self, memory=None, base=MEM_DUMP_BASE):
+        """Flush pending lines, write the memory dump and close the file."""
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+            if memory is not None:
+                # Memory dump: addresses in hex, words in decimal.
+                mem_addr = base
+                for word in memory:
+                    self.file.write(f"0x{mem_addr:08X}:{word}\n")
+                    mem_addr += 4
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # On error keep what was traced so far, without a memory dump.
+        self.close()
+
+
+class NullTrace:
+    """A sink that discards everything, for running without a trace."""
+
+    def step(self, pc, R, rd=0):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self, memory=None, base=MEM_DUMP_BASE):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+# --- Binary trace ---
+#
+# Header: MAGIC, then a little-endian u16 format version.
+# Every record starts with a one-byte tag:
+#   b'S'  full step:    i64 pc, 32 x u32 registers
+#   b'D'  changed step: i64 pc, u32 mask of changed registers, then one u32
+#                       per set bit (lowest register first); registers are
+#                       relative to the previous step, or to all zeros
+#   b'M'  memory dump:  u32 base address, u32 word count, then the words
+# Delta traces (DeltaTrace) use three more:
+#   b'K'  interval:     u32 checkpoint interval K; first record of the file
+#   b'C'  checkpoint:   i64 pc, 32 x u32 registers; written for steps 0, K, 2K...
+#   b'R'  delta step:   i64 pc, u8 rd, u32 new value of rd
+
+MAGIC = b'RVTRACE\0'
+VERSION = 1
+
+FULL_STEP = struct.Struct('<q32I')
+CHANGED_STEP = struct.Struct('<qI')
+MEM_HEADER = struct.Struct('<II')
+WORD = struct.Struct('<I')
+INTERVAL = struct.Struct('<I')
+DELTA_STEP = struct.Struct('<qBI')
+
+
+class BinaryTrace:
+    """Fixed-width binary trace records, optionally storing only the
+    registers that changed since the previous step."""
+
+    def __init__(self, path, changed_only=False, chunk_bytes=CHUNK_BYTES):
+        self.file = open(path, 'wb')
+        self.chunk_bytes = chunk_bytes
+        self.buffer = bytearray(MAGIC + struct.pack('<H', VERSION))
+        self.changed_only = changed_only
+        self.prev = [0] * 32
+
+    def step(self, pc, R, rd=0):
+        buffer = self.buffer
+        if self.changed_only:
+            prev = self.prev
+            mask = 0
+            values = []
+            for i in range(32):
+                if R[i] != prev[i]:
+                    mask |= 1 << i
+                    values.append(R[i])
+                    prev[i] = R[i]
+            buffer += b'D'
+            buffer += CHANGED_STEP.pack(pc, mask)
+            if values:
+                buffer += struct.pack(f'<{len(values)}I', *values)
+        else:
+            buffer += b'S'
+            buffer += FULL_STEP.pack(pc, *R)
+        if len(buffer) >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self, memory=None, base=MEM_DUMP_BASE):
+        """Flush pending records, write the memory dump and close the file."""
+        if self.file.closed:
+            return
+        try:
+            if memory is not None:
+                self.buffer += b'M'
+                self.buffer += MEM_HEADER.pack(base, len(memory))
+                self.buffer += struct.pack(f'<{len(memory)}I', *memory)
+            self.flush()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_binary(path):
+    """Yield ('step', pc, registers) for every step of a binary trace and
+    ('memory', base, words) for its memory dump. `registers` is a fresh list."""
+    with open(path, 'rb') as f:
+        data = f.read(len(MAGIC) + 2)
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a binary trace")
+        version, = struct.unpack('<H', data[len(MAGIC):])
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported binary trace version {version}")
+        regs = [0] * 32
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag == b'S':
+                pc, *regs = FULL_STEP.unpack(f.read(FULL_STEP.size))
+                yield 'step', pc, list(regs)
+            elif tag == b'D':
+                pc, mask = CHANGED_STEP.unpack(f.read(CHANGED_STEP.size))
+                while mask:
+                    low = mask & -mask
+                    regs[low.bit_length() - 1], = WORD.unpack(f.read(WORD.size))
+                    mask ^= low
+                yield 'step', pc, list(regs)
+            elif tag == b'C':
+                pc, *regs = FULL_STEP.unpack(f.read(FULL_STEP.size))
+                yield 'step', pc, list(regs)
+            elif tag == b'R':
+                pc, rd, value = DELTA_STEP.unpack(f.read(DELTA_STEP.size))
+                regs[rd] = value
+                yield 'step', pc, list(regs)
+            elif tag == b'K':
+                f.read(INTERVAL.size)
+            elif tag == b'M':
+                base, count = MEM_HEADER.unpack(f.read(MEM_HEADER.size))
+                yield 'memory', base, list(struct.unpack(f'<{count}I', f.read(4 * count)))
+            else:
+                raise ValueError(f"{path}: corrupt record tag {tag!r} at offset {f.tell() - 1}")
+
+
+class DeltaTrace(BinaryTrace):
+    """Delta-encoded trace: the PC plus the (rd, value) pair each step wrote,
+    with a full-state checkpoint every `interval` steps.
+
+    All records have fixed sizes, so DeltaTraceReader can seek straight to the
+    checkpoint before any step."""
+
+    def __init__(self, path, interval=1024, chunk_bytes=CHUNK_BYTES):
+        super().__init__(path, chunk_bytes=chunk_bytes)
+        self.interval = interval
+        self.until_checkpoint = 0
+        self.buffer += b'K'
+        self.buffer += INTERVAL.pack(interval)
+
+    def step(self, pc, R, rd=0):
+        buffer = self.buffer
+        if self.until_checkpoint:
+            self.until_checkpoint -= 1
+            buffer += b'R'
+            buffer += DELTA_STEP.pack(pc, rd, R[rd])
+        else:
+            self.until_checkpoint = self.interval - 1
+            buffer += b'C'
+            buffer += FULL_STEP.pack(pc, *R)
+        if len(buffer) >= self.chunk_bytes:
+            self.flush()
+
+
+class DeltaTraceReader:
+    """Random access to a delta trace written by DeltaTrace.
+
+    state_at(n) returns (pc, registers) after step n (0-based) by seeking to
+    the nearest checkpoint and replaying at most interval - 1 deltas."""
+
+    HEADER_SIZE = len(MAGIC) + 2 + 1 + INTERVAL.size
+    CHECKPOINT_SIZE = 1 + FULL_STEP.size
+    DELTA_SIZE = 1 + DELTA_STEP.size
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        header = self.file.read(self.HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC) + 2:len(MAGIC) + 3] != b'K':
+            self.file.close()
+            raise ValueError(f"{path}: not a delta trace")
+        self.interval, = INTERVAL.unpack(header[len(MAGIC) + 3:])
+        self.group_size = self.CHECKPOINT_SIZE + (self.interval - 1) * self.DELTA_SIZE
+
+    def state_at(self, n):
+        if n < 0:
+            raise IndexError(n)
+        group, offset = divmod(n, self.interval)
+        f = self.file
+        f.seek(self.HEADER_SIZE + group * self.group_size)
+        if f.read(1) != b'C':
+            raise IndexError(n)
+        pc, *regs = FULL_STEP.unpack(f.read(FULL_STEP.size))
+        for _ in range(offset):
+            if f.read(1) != b'R':
+                raise IndexError(n)
+            pc, rd, value = DELTA_STEP.unpack(f.read(DELTA_STEP.size))
+            regs[rd] = value
+        return pc, regs
+
+    def __iter__(self):
+        """Yield (pc, registers) for every step in order."""
+        f = self.file
+        f.seek(self.HEADER_SIZE)
+        regs = [0] * 32
+        while True:
+            tag = f.read(1)
+            if tag == b'C':
+                pc, *regs = FULL_STEP.unpack(f.read(FULL_STEP.size))
+            elif tag == b'R':
+                pc, rd, value = DELTA_STEP.unpack(f.read(DELTA_STEP.size))
+                regs[rd] = value
+            else:
+                return
+            yield pc, list(regs)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _golden(value):
+    return '0b' + format(value & 0xFFFFFFFF, '032b')
+
+
+def convert(binary_path, text_path, golden=False):
+    """Render a binary trace as the decimal text trace (byte-identical to
+    TextTrace) or, with golden=True, as the 0b-prefixed golden format used in
+    tests/traces."""
+    with open(text_path, 'w') as out:
+        lines = []
+        for kind, a, b in read_binary(binary_path):
+            if kind == 'step':
+                if golden:
+                    lines.append(' '.join(map(_golden, [a] + b)) + ' \n')
+                else:
+                    lines.append(f"{a} " + " ".join(map(str, b)) + "\n")
+            else:
+                for offset, word in enumerate(b):
+                    value = _golden(word) if golden else word
+                    lines.append(f"0x{a + 4 * offset:08X}:{value}\n")
+            if len(lines) >= CHUNK_LINES:
+                out.writelines(lines)
+                lines.clear()
+        out.writelines(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a binary simulator trace to text.")
+    parser.add_argument('binary_trace')
+    parser.add_argument('text_trace')
+    parser.add_argument('--golden', action='store_true', help="write the 0b-prefixed format of tests/traces")
+    args = parser.parse_args()
+    convert(args.binary_trace, args.text_trace, golden=args.golden)